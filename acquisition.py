@@ -0,0 +1,437 @@
+import queue
+import threading
+import time
+
+from pyftdi.i2c import I2cController, I2cIOError
+import usb.core
+
+import burst
+import clockprobe
+import i2ctrace
+import profiles
+from alarms import Alarm
+from busstats import BusStats, InstrumentedController
+from monitors import DRIVERS, FTX, FRX, GETTERS, layout, read_all_monitors, read_monitors
+from regcache import ATTENUATOR, DIGIPOT, UID, RegisterCache
+from scheduler import SIGNALS, Schedule
+from tla2528 import TLA2528
+
+# Event types posted from the workers to the GUI
+EVENT_LOG = "log"
+EVENT_CONNECTED = "connected"
+EVENT_DISCONNECTED = "disconnected"
+EVENT_MONITOR = "monitor"
+EVENT_SETPOINT = "setpoint"
+EVENT_ALARM = "alarm"
+
+# Consecutive failed reads after which the link is considered lost
+LOST_AFTER = 3
+# Reconnection backoff, doubling from the first to the longest wait, in seconds
+RECONNECT_MIN = 0.05
+RECONNECT_MAX = 2.0
+
+
+class Board:
+    """One FTX or FRX board on an I2C interface of the USB adapter.
+
+    Only the acquisition worker that owns the board should call these methods,
+    so that every transaction on the bus is serialized.
+    """
+    VID = 0x0403
+    PID = 0x6048
+    INTERFACES = {FTX: 2, FRX: 1}
+
+    def __init__(self, kind, device=None, controller_factory=I2cController, frequency=None, adapter=None):
+        self.kind = kind
+        self.device = device
+        self.controller_factory = controller_factory
+        # I2C clock in Hz, pyftdi's default if None
+        self.frequency = frequency
+        # Shared adapter.Adapter the USB device is looked up from, if any
+        self.adapter = adapter
+        # i2ctrace.TraceWriter recording the raw bus traffic, if tracing
+        self.trace = None
+        self.i2c = None
+        self.driver = None
+        self.adc = None
+        self.cache = RegisterCache()
+        self.stats = BusStats()
+        self.lna_enabled = False
+        # Last commanded setpoints, kept across reconnects so they can be restored
+        self.setpoints = {}
+        self.usb_address = None
+
+    @property
+    def name(self) -> str:
+        return self.kind.upper()
+
+    @property
+    def connected(self) -> bool:
+        return self.driver is not None
+
+    def connect(self) -> None:
+        """Configure the I2C interface and create the board driver.
+
+        Raises ConnectionError if the USB device cannot be found.
+        """
+        dev = self.device
+        if dev is None and self.adapter is not None:
+            dev = self.adapter.find()
+        elif dev is None:
+            dev = usb.core.find(idVendor=self.VID, idProduct=self.PID)
+        if dev is None:
+            raise ConnectionError("USB device not found")
+        self.usb_address = (dev.bus, dev.address) if hasattr(dev, "bus") else None
+        self.cache.clear()
+        options = {"interface": self.INTERFACES[self.kind]}
+        if self.frequency:
+            options["frequency"] = self.frequency
+        controller = self.controller_factory()
+        try:
+            controller.configure(dev, **options)
+        except OSError:
+            if self.adapter is not None:
+                # Most likely unplugged, look the device up again next time
+                self.adapter.forget()
+            raise
+        if self.trace is not None:
+            controller = i2ctrace.TracingController(controller, self.trace)
+        self.i2c = InstrumentedController(controller, self.stats)
+        self.driver = DRIVERS[self.kind](self.i2c)
+        adc_address = layout(self.kind).adc_address
+        self.adc = TLA2528(self.i2c.get_port(adc_address)) if adc_address is not None else None
+
+    def close(self) -> None:
+        if self.i2c is not None:
+            self.i2c.close()
+        self.i2c = None
+        self.driver = None
+        self.adc = None
+        self.cache.clear()
+        self.lna_enabled = False
+
+    def read_monitors(self, names=None) -> dict:
+        """Read the named monitor values from the board, or all of them.
+
+        The monitors with an ADC channel in the board's monitors.Layout are read in
+        a single burst and returned as raw codes, use monitors.to_engineering() to
+        convert them. Any other monitor is read through its driver getter, in
+        engineering units. The LNA fault input is returned as a bool, the serial
+        number as a string and the attenuation in dB.
+        """
+        getters = GETTERS[self.kind]
+        wanted = [name for name in getters if names is None or name in names]
+        if self.kind == FTX and not self.lna_enabled:
+            wanted = [name for name in wanted if name not in ("lna_current", "lna_voltage")]
+        values = read_monitors(self.adc, self.kind, wanted)
+        for name in wanted:
+            if name not in values:
+                values[name] = getattr(self.driver, getters[name])()
+        if self.kind == FTX and (names is None or "lna_fault" in names):
+            values["lna_fault"] = bool(self.driver.get_lna_fault())
+        values["uid"] = self.get_uid()
+        values["atten"] = self.get_atten()
+        return values
+
+    def read_all_monitors(self) -> dict:
+        """Raw codes of every monitor with an ADC channel, see monitors.layout()."""
+        return read_all_monitors(self.adc, self.kind)
+
+    def get_uid(self) -> str:
+        return self.cache.get(UID, self.driver.get_uid)
+
+    def get_atten(self) -> float:
+        """Attenuation in dB, from the cache unless it hasn't been read since connecting."""
+        return self.cache.get(ATTENUATOR, self.driver.get_atten)
+
+    @property
+    def ld_setpoint(self):
+        """Last commanded laser current in mA, None if not set since connecting."""
+        return self.cache.peek(DIGIPOT)
+
+    def set_atten(self, value, wait=0.1) -> float:
+        """Set the attenuation and return the value read back after `wait` seconds, which is cached."""
+        self.cache.invalidate(ATTENUATOR)
+        self.driver.set_atten(value)
+        self.setpoints["atten"] = value
+        time.sleep(wait)
+        return self.get_atten()
+
+    def set_ld_current(self, value, wait=0.1) -> float:
+        """Set the laser current and return the monitored current after `wait` seconds."""
+        self.cache.invalidate(DIGIPOT)
+        self.driver.set_ld_current(value)
+        self.cache.put(DIGIPOT, value)
+        self.setpoints["ld_current"] = value
+        time.sleep(wait)
+        return self.driver.get_ld_current()
+
+    def probe_frequency(self, frequencies=clockprobe.FREQUENCIES, rounds=10) -> tuple:
+        """Reconnect at the fastest reliable I2C clock and restore the setpoints, see clockprobe.probe()."""
+        result = clockprobe.probe(self, frequencies, rounds)
+        profiles.apply(self, self.setpoints, wait=0)
+        return result
+
+    def start_trace(self, file_path) -> None:
+        """Record the raw I2C traffic to a trace file, see i2ctrace.py.
+
+        A connected board is reconnected, so the trace starts from the driver's
+        initialization and replays from the beginning.
+        """
+        self.stop_trace()
+        self.trace = i2ctrace.TraceWriter(file_path, self.kind)
+        if self.connected:
+            self.close()
+            self.connect()
+            profiles.apply(self, self.setpoints, wait=0)
+
+    def stop_trace(self) -> None:
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+    def capture_rf(self, samples=10000, duration=None, osr=0):
+        """Burst capture of the RF monitor, see burst.capture()."""
+        return burst.capture(self.adc, self.kind, "rf_power", samples, duration, osr, self.get_uid())
+
+    def apply_profile(self, table, wait=0.1):
+        """Apply this board's profile from a profile table, see profiles.apply_matching()."""
+        return profiles.apply_matching(self, table, wait)
+
+    def set_lna_enable(self, value) -> dict:
+        self.driver.set_lna_enable(value)
+        self.lna_enabled = bool(value)
+        self.setpoints["lna_enable"] = bool(value)
+        if not value:
+            return {}
+        return {"lna_current": self.driver.get_lna_current(), "lna_voltage": self.driver.get_lna_voltage()}
+
+
+class AcquisitionWorker(threading.Thread):
+    """Background thread that owns a Board and does all of its bus access.
+
+    Commands from the GUI are queued with submit() and run in order between
+    monitor reads, which follow the board's Schedule. Results are posted to the events queue as
+    (event, board kind, payload) tuples, which the render loop drains each frame.
+    Every monitor reading is also passed to the listeners, as listener(kind, values),
+    on the worker thread, and checked by the alarm engine if there is one. The
+    protective action of a raised alarm is run before the next read.
+
+    If the link to the board is lost (repeated failed reads, or the adapter going
+    away) the worker reconnects by itself with a growing backoff and restores the
+    last commanded setpoints, until it is told to disconnect.
+    """
+
+    def __init__(self, board, events, schedule=None, alarms=None):
+        super().__init__(name=board.name + "-acquisition", daemon=True)
+        self.board = board
+        self.events = events
+        self.schedule = schedule or Schedule(SIGNALS[board.kind])
+        self.listeners = []
+        self.alarms = alarms
+        self._commands = queue.Queue()
+        self._polling = False
+        self._lost = False
+        self._lost_at = 0.0
+        self._failures = 0
+        self._backoff = RECONNECT_MIN
+        self._retry_at = 0.0
+
+    def submit(self, command, *args, reply=None) -> None:
+        """Queue a command (a Board method name or "connect"/"disconnect"/"stop") for the worker.
+
+        If given, reply(result, error) is called on the worker thread once the command has run.
+        A command that raises is reported through reply and the log, the worker carries on.
+        """
+        self._commands.put((command, args, reply))
+
+    def stop(self) -> None:
+        self.submit("stop")
+
+    def _post(self, event, payload=None) -> None:
+        self.events.put((event, self.board.kind, payload))
+
+    def run(self) -> None:
+        while True:
+            timeout = None
+            if self._polling:
+                timeout = max(0.0, self.schedule.next_deadline() - time.monotonic())
+            elif self._lost:
+                timeout = max(0.0, self._retry_at - time.monotonic())
+            try:
+                command, args, reply = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                if self._lost:
+                    self._reconnect()
+                else:
+                    self._poll()
+                continue
+            if command == "stop":
+                self._disconnect(quiet=True)
+                return
+            self._handle(command, args, reply)
+
+    def _handle(self, command, args, reply=None) -> None:
+        try:
+            result, error = self._command(command, args)
+        except Exception as e:
+            # A bad argument or a driver bug fails the command, not the worker
+            self._post(EVENT_LOG, command + " failed on the " + self.board.name + " board: " + str(e))
+            result, error = None, e
+        if reply is not None:
+            reply(result, error)
+
+    def _command(self, command, args) -> tuple:
+        """Run a queued command, returns (result, error)."""
+        if command == "connect":
+            if self._lost:
+                self._backoff = RECONNECT_MIN
+                self._reconnect()
+            else:
+                self._connect()
+            result, error = self.board.connected, None
+        elif command == "disconnect":
+            if self._lost:
+                self._lost = False
+                self._post(EVENT_LOG, "Stopped reconnecting to the " + self.board.name + " board.")
+            self._disconnect()
+            result, error = True, None
+        elif command == "usb_changed":
+            self._usb_changed(*args)
+            result, error = None, None
+        elif self.board.connected:
+            result, error = self._setpoint(command, args)
+        else:
+            result, error = None, ConnectionError(self.board.name + " board is not connected")
+        return result, error
+
+    def _connect(self) -> None:
+        if self.board.connected:
+            return
+        try:
+            self.board.connect()
+        except ConnectionError:
+            self._post(EVENT_LOG, "USB Device not found!")
+            return
+        except OSError:
+            self.board.close()
+            self._post(EVENT_LOG, "Could not connect to " + self.board.name +
+                       " board, check connection and try again.")
+            return
+        self._post(EVENT_CONNECTED)
+        self.schedule.reset(time.monotonic())
+        self._polling = True
+        self._poll()
+
+    def _usb_changed(self, added, removed) -> None:
+        """The USB watcher saw adapters come or go: drop the link at once if ours went
+        away, retry straight away if one arrived while reconnecting."""
+        if self.board.connected and self.board.usb_address in removed:
+            self._link_lost()
+        elif self._lost and added:
+            self._backoff = RECONNECT_MIN
+            self._reconnect()
+
+    def _link_lost(self) -> None:
+        """Close the board after a lost link and start reconnecting."""
+        self._polling = False
+        try:
+            self.board.close()
+        except OSError:
+            pass
+        self._lost = True
+        self._failures = 0
+        self._backoff = RECONNECT_MIN
+        self._retry_at = time.monotonic() + self._backoff
+        self._lost_at = time.monotonic()
+        self._post(EVENT_DISCONNECTED, "lost")
+        self._post(EVENT_LOG, "Lost the connection to the " + self.board.name + " board, reconnecting...")
+
+    def _reconnect(self) -> None:
+        """Try to reconnect after a lost link, restoring the last commanded setpoints."""
+        try:
+            self.board.connect()
+            restored = profiles.apply(self.board, self.board.setpoints, wait=0)
+        except OSError:
+            try:
+                self.board.close()
+            except OSError:
+                pass
+            self._backoff = min(2 * self._backoff, RECONNECT_MAX)
+            self._retry_at = time.monotonic() + self._backoff
+            return
+        self._lost = False
+        self._post(EVENT_CONNECTED)
+        self._post(EVENT_LOG, "Reconnected to the " + self.board.name + " board after {:.2f} s.".format(
+            time.monotonic() - self._lost_at))
+        if restored["written"]:
+            self._post(EVENT_SETPOINT, ("restore", (), restored))
+        self.schedule.reset(time.monotonic())
+        self._polling = True
+        self._poll()
+
+    def _disconnect(self, quiet=False) -> None:
+        if not self.board.connected:
+            return
+        self._polling = False
+        self.board.close()
+        if self.alarms is not None:
+            self.alarms.reset(self.board.kind)
+        if not quiet:
+            self._post(EVENT_DISCONNECTED)
+
+    def _setpoint(self, command, args) -> tuple:
+        try:
+            result = getattr(self.board, command)(*args)
+        except TimeoutError as e:
+            self._post(EVENT_LOG, "Timeout while applying " + command + " on the " + self.board.name + " board.")
+            return None, e
+        except I2cIOError as e:
+            self._post(EVENT_LOG, "I2C error while applying " + command + " on the " + self.board.name + " board.")
+            return None, e
+        except OSError as e:
+            # The adapter itself is gone (USB or FTDI error)
+            self._link_lost()
+            return None, e
+        self._post(EVENT_SETPOINT, (command, args, result))
+        if self.alarms is not None:
+            for rule in self.alarms.rearm(self.board.kind, command, args):
+                self._post(EVENT_ALARM, Alarm(self.board.kind, rule, float("nan"), False))
+        return result, None
+
+    def _poll(self) -> None:
+        """Read the signals that are due and reschedule them."""
+        now = time.monotonic()
+        names = self.schedule.due(now)
+        if not names:
+            return
+        try:
+            values = self.board.read_monitors(names)
+        except (TimeoutError, I2cIOError):
+            for name in names:
+                self.schedule.update(name, None, now)
+            self._failures += 1
+            if self._failures >= LOST_AFTER:
+                self._link_lost()
+            else:
+                self._post(EVENT_LOG, "Timeout while reading " + self.board.name + " monitor values.")
+            return
+        except OSError:
+            # The adapter itself is gone (USB or FTDI error)
+            self._link_lost()
+            return
+        self._failures = 0
+        for name in names:
+            self.schedule.update(name, values.get(name), now)
+        for listener in tuple(self.listeners):
+            listener(self.board.kind, values)
+        self._post(EVENT_MONITOR, values)
+        if self.alarms is not None:
+            self._check_alarms(values)
+
+    def _check_alarms(self, values) -> None:
+        for alarm in self.alarms.evaluate({self.board.kind: (self.board.kind, values)}):
+            self._post(EVENT_ALARM, alarm)
+            if alarm.active and alarm.rule.action:
+                command, *args = alarm.rule.action
+                self._handle(command, tuple(args))
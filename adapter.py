@@ -0,0 +1,50 @@
+"""One physical USB-I2C adapter shared by the FTX and FRX boards.
+
+The adapter's USB device is looked up once and handed to the boards on both of
+its interfaces, instead of each board enumerating the bus on every connect, and
+the I2C clock is chosen per board.
+
+    adapter = Adapter(frequencies={"ftx": 400000, "frx": 400000})
+    ftx, frx = adapter.board(FTX), adapter.board(FRX)
+"""
+import threading
+
+from pyftdi.i2c import I2cController
+import usb.core
+
+from acquisition import Board, FTX, FRX
+from fleet import find_adapters
+
+
+class Adapter:
+    """A USB-I2C adapter, by serial number or the first one found, and its two boards."""
+
+    def __init__(self, serial=None, frequencies=None, controller_factory=I2cController):
+        self.serial = serial
+        self.frequencies = dict(frequencies or {})
+        self.controller_factory = controller_factory
+        self._device = None
+        self._lock = threading.Lock()
+
+    def find(self):
+        """The adapter's USB device, looked up on first use and then shared. None if not attached."""
+        with self._lock:
+            if self._device is None:
+                if self.serial is not None:
+                    self._device = find_adapters().get(self.serial)
+                else:
+                    self._device = usb.core.find(idVendor=Board.VID, idProduct=Board.PID)
+            return self._device
+
+    def forget(self) -> None:
+        """Drop the cached device, e.g. after it was unplugged."""
+        with self._lock:
+            self._device = None
+
+    def board(self, kind) -> Board:
+        """A Board on this adapter's interface for the kind, at the kind's I2C clock."""
+        return Board(kind, controller_factory=self.controller_factory, frequency=self.frequencies.get(kind),
+                     adapter=self)
+
+    def boards(self) -> dict:
+        return {kind: self.board(kind) for kind in (FTX, FRX)}
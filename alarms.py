@@ -0,0 +1,158 @@
+"""Limit alarms on the monitor readings, with hysteresis and debounce.
+
+A Rule puts low and/or high limits on one monitor of a board kind. It raises
+after `debounce` consecutive readings out of range and clears after `debounce`
+consecutive readings back inside the limits by at least `hysteresis`, so a value
+sitting on a limit doesn't chatter. A rule can name a protective action, a Board
+method and its arguments, that the acquisition worker runs in the same poll cycle
+the alarm is raised in.
+
+The state of every rule on every board is kept in NumPy arrays, and evaluate()
+converts a whole batch of readings, one per board, through the boards' conversion
+tables and checks them in a few array operations, so a fleet poll is checked in
+one pass.
+"""
+from collections import namedtuple
+import json
+import threading
+
+import numpy as np
+
+from monitors import FTX, FRX, converter
+
+Rule = namedtuple("Rule", ["kind", "name", "low", "high", "hysteresis", "debounce", "action"])
+Rule.__new__.__defaults__ = (None, None, 0.0, 1, None)
+
+# An alarm raised or cleared, value is in engineering units, NaN for an alarm re-armed by a setpoint
+Alarm = namedtuple("Alarm", ["board", "rule", "value", "active"])
+
+LNA_OFF = ("set_lna_enable", False)
+
+DEFAULT_RULES = (
+    Rule(FTX, "temp", high=70.0, hysteresis=2.0, debounce=2),
+    Rule(FTX, "ld_current", low=5.0, high=45.0, hysteresis=0.5, debounce=2),
+    Rule(FTX, "vdd", low=3.135, high=3.465, hysteresis=0.02, debounce=2),
+    Rule(FTX, "vdda", low=3.135, high=3.465, hysteresis=0.02, debounce=2),
+    Rule(FTX, "lna_current", high=90.0, hysteresis=5.0, debounce=2, action=LNA_OFF),
+    Rule(FTX, "lna_fault", high=0.5, debounce=1, action=LNA_OFF),
+    Rule(FRX, "pd_current", low=0.05, hysteresis=0.01, debounce=3),
+    Rule(FRX, "temp", high=70.0, hysteresis=2.0, debounce=2),
+)
+
+
+def load_rules(file_path) -> tuple:
+    """Rules from a JSON list of objects with the Rule fields, action as [method, args...]."""
+    with open(file_path) as f:
+        entries = json.load(f)
+    rules = []
+    for entry in entries:
+        action = entry.get("action")
+        entry["action"] = tuple(action) if action else None
+        rules.append(Rule(**entry))
+    return tuple(rules)
+
+
+def describe(alarm) -> str:
+    """Console message for an alarm."""
+    rule = alarm.rule
+    name = rule.kind.upper() + " " + rule.name
+    if not alarm.active and np.isnan(alarm.value):
+        return name + " alarm re-armed."
+    if not alarm.active:
+        return name + " back within limits ({:.2f}).".format(alarm.value)
+    if rule.high is not None and alarm.value > rule.high:
+        return "**ALARM** " + name + " {:.2f} above {:.2f}.".format(alarm.value, rule.high)
+    return "**ALARM** " + name + " {:.2f} below {:.2f}.".format(alarm.value, rule.low)
+
+
+class AlarmEngine:
+    """State of every rule on every board, evaluated in batches of readings.
+
+    Safe to share between acquisition workers.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = tuple(rules)
+        self.low = np.array([-np.inf if r.low is None else r.low for r in self.rules])
+        self.high = np.array([np.inf if r.high is None else r.high for r in self.rules])
+        self.hysteresis = np.array([r.hysteresis for r in self.rules])
+        self.debounce = np.array([r.debounce for r in self.rules])
+        self.boards = {}  # board id -> row in the state arrays
+        self.active = np.zeros((0, len(self.rules)), dtype=bool)
+        self.count = np.zeros((0, len(self.rules)), dtype=int)  # consecutive readings towards a change
+        self._lock = threading.Lock()
+
+    def _row(self, board) -> int:
+        row = self.boards.get(board)
+        if row is None:
+            row = self.boards[board] = len(self.boards)
+            self.active = np.vstack([self.active, np.zeros((1, len(self.rules)), dtype=bool)])
+            self.count = np.vstack([self.count, np.zeros((1, len(self.rules)), dtype=int)])
+        return row
+
+    def evaluate(self, readings) -> list:
+        """Check a batch of raw readings, a dict of board id -> (kind, values).
+
+        Returns the alarms raised or cleared by this batch. Rules with no reading
+        in the batch keep their state.
+        """
+        with self._lock:
+            rows = np.array([self._row(board) for board in readings], dtype=int)
+            value = np.full((len(rows), len(self.rules)), np.nan)
+            for i, (kind, values) in enumerate(readings.values()):
+                # ADC codes are looked up, other entries (LNA fault) are used as they are
+                converted = converter(kind, values.get("uid")).to_engineering(values)
+                for j, rule in enumerate(self.rules):
+                    v = converted.get(rule.name) if rule.kind == kind else None
+                    if v is not None:
+                        value[i, j] = v
+            seen = ~np.isnan(value)
+            out = (value < self.low) | (value > self.high)
+            inside = (value >= self.low + self.hysteresis) & (value <= self.high - self.hysteresis)
+            active = self.active[rows]
+            # Count consecutive readings against the current state, reset by one that agrees with it
+            toward = np.where(active, inside, out)
+            count = np.where(seen, np.where(toward, self.count[rows] + 1, 0), self.count[rows])
+            changed = seen & (count >= self.debounce)
+            active ^= changed
+            count[changed] = 0
+            self.active[rows] = active
+            self.count[rows] = count
+            boards = list(readings)
+            return [Alarm(boards[i], self.rules[j], float(value[i, j]), bool(active[i, j]))
+                    for i, j in zip(*np.nonzero(changed))]
+
+    def active_alarms(self) -> list:
+        """(board id, rule) of every alarm currently raised."""
+        with self._lock:
+            boards = list(self.boards)
+            return [(boards[i], self.rules[j]) for i, j in zip(*np.nonzero(self.active))]
+
+    def rearm(self, board, command, args) -> list:
+        """Clear the rules of a board whose protective action a setpoint just undid.
+
+        An action like LNA_OFF can stop its own monitor from being read, which
+        would leave the alarm raised for good and never act again. Once the
+        operator turns the LNA back on, the rule starts over, so a fault still
+        there is raised and acted on again. Returns the rules that were raised.
+        """
+        with self._lock:
+            row = self.boards.get(board)
+            if row is None:
+                return []
+            rearmed = []
+            for j, rule in enumerate(self.rules):
+                if rule.action and rule.action[0] == command and tuple(rule.action[1:]) != tuple(args):
+                    if self.active[row, j]:
+                        rearmed.append(rule)
+                    self.active[row, j] = False
+                    self.count[row, j] = 0
+            return rearmed
+
+    def reset(self, board) -> None:
+        """Clear the state of a board, e.g. after it disconnects."""
+        with self._lock:
+            row = self.boards.get(board)
+            if row is not None:
+                self.active[row] = False
+                self.count[row] = 0
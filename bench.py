@@ -0,0 +1,80 @@
+"""Hardware free benchmark of the monitor path on the simulated I2C bus.
+
+    python bench.py --adapters 8 --refreshes 50 --latency 0.0005
+
+For 1..N adapters (an FTX and an FRX each) it reports the I2C transactions per
+board refresh, the fleet refresh latency percentiles and the maximum poll rate
+the fleet can sustain.
+"""
+import argparse
+import statistics
+import time
+
+from acquisition import Board, FTX, FRX
+from fleet import DeviceManager
+from simbus import SimulatedAdapter
+
+
+def percentile(samples, p) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def bench_fleet(n_adapters, refreshes, **options) -> dict:
+    """Poll a fleet of simulated adapters and return the refresh statistics."""
+    manager = DeviceManager(max_workers=2 * n_adapters)
+    adapters = []
+    for i in range(n_adapters):
+        adapter = SimulatedAdapter("SIM{}".format(i), **options)
+        adapters.append(adapter)
+        for kind in (FTX, FRX):
+            board = Board(kind, device=adapter, controller_factory=adapter.controller)
+            board.connect()
+            manager.add((adapter.serial, kind), board)
+    manager.poll()  # first refresh fills the register cache
+    before = sum(a.transactions for a in adapters)
+    latencies = []
+    errors = 0
+    try:
+        for _ in range(refreshes):
+            t0 = time.perf_counter()
+            results = manager.poll()
+            latencies.append(time.perf_counter() - t0)
+            errors += sum(isinstance(r, Exception) for r in results.values())
+    finally:
+        manager.close()
+    transactions = sum(a.transactions for a in adapters) - before
+    mean = statistics.mean(latencies)
+    return {
+        "boards": 2 * n_adapters,
+        "transactions": transactions / refreshes / (2 * n_adapters),
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max_rate": 1 / mean,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--adapters", type=int, default=4, help="largest number of adapters to simulate")
+    parser.add_argument("--refreshes", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0005, help="seconds added to each transaction")
+    parser.add_argument("--byte-time", type=float, default=0.00009, help="seconds per byte (100 kHz bus)")
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--nack-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print("{:>6} {:>12} {:>9} {:>9} {:>9} {:>10} {:>7}".format(
+        "boards", "trans/board", "p50 ms", "p90 ms", "p99 ms", "max Hz", "errors"))
+    for n in range(1, args.adapters + 1):
+        r = bench_fleet(n, args.refreshes, latency=args.latency, byte_time=args.byte_time,
+                        timeout_rate=args.timeout_rate, nack_rate=args.nack_rate)
+        print("{:>6} {:>12.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.1f} {:>7}".format(
+            r["boards"], r["transactions"], r["p50"] * 1000, r["p90"] * 1000, r["p99"] * 1000, r["max_rate"],
+            r["errors"]))
+
+
+if __name__ == '__main__':
+    main()
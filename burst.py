@@ -0,0 +1,53 @@
+"""High rate burst capture of the RF monitor channel.
+
+The channel is converted back to back with long I2C reads (see
+TLA2528.capture), so the sample rate is limited only by the bus clock. Codes go
+straight into a preallocated NumPy buffer and are converted in one vectorized
+pass.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from monitors import converter, layout
+from tla2528 import AVERAGED_RESOLUTION, RESOLUTION
+
+BurstCapture = namedtuple("BurstCapture", ["kind", "name", "times", "codes", "values", "stats"])
+
+
+def summarize(times, values) -> dict:
+    """Summary statistics of a capture."""
+    if not len(values):
+        return {"samples": 0}
+    elapsed = float(times[-1] - times[0])
+    return {
+        "samples": len(values),
+        "duration": elapsed,
+        "rate": (len(values) - 1) / elapsed if elapsed > 0 else 0.0,
+        "mean": float(np.mean(values)),
+        "std": float(np.std(values)),
+        "min": float(np.min(values)),
+        "max": float(np.max(values)),
+        "p2p": float(np.ptp(values)),
+    }
+
+
+def capture(adc, kind, name="rf_power", samples=10000, duration=None, osr=0, serial=None) -> BurstCapture:
+    """Capture one monitor channel of a board as fast as possible.
+
+    Times are in seconds from the first sample. serial picks the board's calibration.
+    Raises ValueError if the monitor isn't read through the ADC, see monitors.layout().
+    """
+    channel = layout(kind).channels.get(name)
+    if adc is None or channel is None:
+        raise ValueError("The " + kind.upper() + " " + name + " monitor has no ADC channel to capture")
+    times, codes = adc.capture(channel, samples, duration=duration, osr=osr)
+    if len(times):
+        times -= times[0]
+    values = converter(kind, serial).convert(name, codes, AVERAGED_RESOLUTION if osr else RESOLUTION)
+    return BurstCapture(kind, name, times, codes, values, summarize(times, values))
+
+
+def save(file_path, burst) -> None:
+    """Save a capture as a .npz file of times, codes and values."""
+    np.savez(file_path, times=burst.times, codes=burst.codes, values=burst.values)
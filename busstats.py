@@ -0,0 +1,150 @@
+"""I2C transaction statistics per device address and operation.
+
+InstrumentedController wraps an I2cController so that every port the board
+drivers get from it is an InstrumentedPort, which counts transactions, bytes and
+errors and keeps a latency histogram for each (address, operation).
+"""
+import bisect
+import json
+import threading
+import time
+
+from monitors import device_name
+
+# Upper edges of the latency histogram buckets, in microseconds. The last bucket is everything above.
+BUCKETS_US = (50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+
+
+class OpStats:
+    """Counters for one operation on one device address."""
+    __slots__ = ("count", "bytes", "total_us", "max_us", "errors", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.total_us = 0.0
+        self.max_us = 0.0
+        self.errors = {}
+        self.histogram = [0] * (len(BUCKETS_US) + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "bytes": self.bytes,
+            "mean_us": self.total_us / self.count if self.count else 0.0,
+            "max_us": self.max_us,
+            "errors": dict(self.errors),
+            "error_rate": sum(self.errors.values()) / self.count if self.count else 0.0,
+            "histogram_us": dict(zip([str(b) for b in BUCKETS_US] + ["inf"], self.histogram)),
+        }
+
+
+class BusStats:
+    """Transaction statistics for one I2C bus, safe to read from any thread."""
+
+    def __init__(self):
+        self._ops = {}
+        self._lock = threading.Lock()
+
+    def add(self, address, op, nbytes, elapsed, error=None) -> None:
+        us = elapsed * 1e6
+        with self._lock:
+            stats = self._ops.get((address, op))
+            if stats is None:
+                stats = self._ops[(address, op)] = OpStats()
+            stats.count += 1
+            stats.bytes += nbytes
+            stats.total_us += us
+            stats.max_us = max(stats.max_us, us)
+            stats.histogram[bisect.bisect_left(BUCKETS_US, us)] += 1
+            if error is not None:
+                name = type(error).__name__
+                stats.errors[name] = stats.errors.get(name, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._ops.clear()
+
+    def snapshot(self) -> dict:
+        """{"0x10": {"read": {...}, ...}, ...} for every address and operation seen."""
+        with self._lock:
+            out = {}
+            for (address, op), stats in sorted(self._ops.items()):
+                out.setdefault("0x{:02X}".format(address), {})[op] = stats.to_dict()
+            return out
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def summary(self) -> list:
+        """One line per device address: transactions, bytes, mean latency and errors."""
+        with self._lock:
+            per_address = {}
+            for (address, op), stats in self._ops.items():
+                total = per_address.setdefault(address, [0, 0, 0.0, 0])
+                total[0] += stats.count
+                total[1] += stats.bytes
+                total[2] += stats.total_us
+                total[3] += sum(stats.errors.values())
+        lines = []
+        for address, (count, nbytes, total_us, errors) in sorted(per_address.items()):
+            lines.append("{:<8}{:>7} tx {:>8} B {:>7.0f} us {:>4} err".format(
+                device_name(address), count, nbytes,
+                total_us / count if count else 0.0, errors))
+        return lines
+
+
+class InstrumentedPort:
+    """An I2cPort that records every transaction in a BusStats."""
+
+    def __init__(self, port, stats):
+        self._port = port
+        self._stats = stats
+        self.address = port._address
+
+    def _call(self, op, nbytes, func, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except OSError as e:
+            self._stats.add(self.address, op, nbytes, time.perf_counter() - t0, e)
+            raise
+        self._stats.add(self.address, op, nbytes, time.perf_counter() - t0)
+        return result
+
+    def read(self, readlen=0, relax=True, start=True) -> bytes:
+        return self._call("read", readlen, self._port.read, readlen, relax=relax, start=start)
+
+    def write(self, out, relax=True, start=True) -> None:
+        out = bytes(out)
+        return self._call("write", len(out), self._port.write, out, relax=relax, start=start)
+
+    def exchange(self, out=b'', readlen=0, relax=True, start=True) -> bytes:
+        out = bytes(out)
+        return self._call("exchange", len(out) + readlen, self._port.exchange, out, readlen, relax=relax,
+                          start=start)
+
+    def read_from(self, regaddr, readlen=0, relax=True, start=True) -> bytes:
+        return self._call("exchange", readlen + 1, self._port.read_from, regaddr, readlen, relax=relax,
+                          start=start)
+
+    def write_to(self, regaddr, out, relax=True, start=True) -> None:
+        out = bytes(out)
+        return self._call("write", len(out) + 1, self._port.write_to, regaddr, out, relax=relax, start=start)
+
+    def __getattr__(self, name):
+        return getattr(self._port, name)
+
+
+class InstrumentedController:
+    """Wraps an I2cController so the ports it hands out are instrumented."""
+
+    def __init__(self, controller, stats):
+        self._controller = controller
+        self.stats = stats
+
+    def get_port(self, address) -> InstrumentedPort:
+        return InstrumentedPort(self._controller.get_port(address), self.stats)
+
+    def __getattr__(self, name):
+        return getattr(self._controller, name)
@@ -0,0 +1,424 @@
+"""Headless command line interface to the FTX and FRX boards.
+
+    python main.py get ftx [NAME ...]
+    python main.py set frx atten 10.5
+    python main.py monitor --interval 0.5 --output run.csv
+
+Nothing from the GUI stack is imported here, and the hardware modules are only
+imported once a command needs them, so scripted runs start quickly.
+"""
+import argparse
+import sys
+import time
+
+SETTINGS = ("atten", "ld_current", "lna_enable")
+
+# Every board opened by the command, for the --stats dump
+_opened = []
+# Adapters by serial number (None for the first one found), shared by the boards opened on them
+_adapters = {}
+
+
+def _open(kind, adapter=None, frequency=None, trace=None):
+    """Connect to the board of the given kind, on the first adapter unless one is given.
+
+    frequency is the I2C clock in Hz, pyftdi's default if None. If trace is given,
+    the raw bus traffic is recorded to trace + "_" + kind + ".i2ct".
+    """
+    from adapter import Adapter
+    shared = _adapters.get(adapter)
+    if shared is None:
+        shared = _adapters[adapter] = Adapter(serial=adapter)
+    if adapter is not None and shared.find() is None:
+        raise ConnectionError("USB adapter " + adapter + " not found")
+    board = shared.board(kind)
+    board.frequency = frequency
+    if trace:
+        from i2ctrace import TraceWriter
+        board.trace = TraceWriter(trace + "_" + kind + ".i2ct", kind)
+    _opened.append(board)
+    board.connect()
+    return board
+
+
+def _read(board) -> dict:
+    from monitors import to_engineering
+    return to_engineering(board.kind, board.read_monitors())
+
+
+def _format(value) -> str:
+    if isinstance(value, float):
+        return "{:.2f}".format(value)
+    return str(value)
+
+
+def _report_startup(start) -> None:
+    if start is not None:
+        sys.stderr.write("First reading {:.0f} ms after start\n".format((time.perf_counter() - start) * 1000))
+        sys.stderr.flush()
+
+
+def cmd_get(args, start=None) -> int:
+    board = _open(args.board, args.adapter, args.frequency, args.trace)
+    try:
+        values = _read(board)
+    finally:
+        board.close()
+    _report_startup(start)
+    for name, value in values.items():
+        if not args.names or name in args.names:
+            print(name, _format(value))
+    return 0
+
+
+def cmd_set(args, start=None) -> int:
+    from profiles import SETTINGS as BOARD_SETTINGS
+    if args.setting not in BOARD_SETTINGS[args.board]:
+        raise ValueError(args.board.upper() + " boards have no " + args.setting + " setting")
+    if args.setting == "lna_enable":
+        value = args.value.lower() in ("1", "on", "true", "yes")
+    else:
+        value = float(args.value)
+    board = _open(args.board, args.adapter, args.frequency, args.trace)
+    try:
+        result = getattr(board, "set_" + args.setting)(value)
+    finally:
+        board.close()
+    if isinstance(result, dict):
+        for name, read_back in result.items():
+            print(name, _format(read_back))
+    else:
+        print(args.setting, _format(result))
+    return 0
+
+
+def cmd_monitor(args, start=None) -> int:
+    """Stream readings as time,board,name,value lines until interrupted."""
+    from pyftdi.i2c import I2cIOError
+    from monitors import to_engineering
+    boards = [_open(kind, args.adapter, args.frequency, args.trace) for kind in args.boards]
+    out = open(args.output, "a") if args.output else sys.stdout
+    recorder = None
+    if args.record:
+        from recorder import Recorder
+        recorder = Recorder(args.record)
+    telemetry = None
+    if args.store:
+        from store import TelemetryStore
+        telemetry = TelemetryStore(args.store)
+    engine = None
+    if args.alarms is not None:
+        from alarms import AlarmEngine, DEFAULT_RULES, load_rules
+        engine = AlarmEngine(load_rules(args.alarms) if args.alarms else DEFAULT_RULES)
+    try:
+        if out is sys.stdout or out.tell() == 0:
+            out.write("time,board,name,value\n")
+        n = 0
+        while args.count is None or n < args.count:
+            t0 = time.time()
+            batch = {}
+            for board in boards:
+                try:
+                    raw = board.read_monitors()
+                    values = to_engineering(board.kind, raw)
+                except (TimeoutError, I2cIOError):
+                    # A timeout or NACK on one board skips its reading, the others keep going
+                    sys.stderr.write("Timeout or I2C error while reading " + board.name + " monitor values.\n")
+                    continue
+                if recorder is not None:
+                    recorder.record(board.kind, raw, timestamp=t0)
+                if telemetry is not None:
+                    telemetry.record(board.kind, raw, timestamp=t0)
+                batch[board.kind] = (board.kind, raw)
+                for name, value in values.items():
+                    out.write("{:.3f},{},{},{}\n".format(t0, board.kind, name, _format(value)))
+            if engine is not None:
+                _check_alarms(engine, batch, boards)
+            out.flush()
+            if n == 0:
+                _report_startup(start)
+            n += 1
+            time.sleep(max(0.0, args.interval - (time.time() - t0)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for board in boards:
+            board.close()
+        if recorder is not None:
+            recorder.close()
+        if telemetry is not None:
+            telemetry.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def _check_alarms(engine, batch, boards) -> None:
+    from alarms import describe
+    by_kind = {board.kind: board for board in boards}
+    for alarm in engine.evaluate(batch):
+        sys.stderr.write(describe(alarm) + "\n")
+        if alarm.active and alarm.rule.action:
+            command, *action_args = alarm.rule.action
+            getattr(by_kind[alarm.board], command)(*action_args)
+
+
+def cmd_capture(args, start=None) -> int:
+    """Burst capture of the RF monitor, printing summary statistics."""
+    from burst import save
+    board = _open(args.board, args.adapter, args.frequency, args.trace)
+    try:
+        capture = board.capture_rf(args.samples, args.duration, args.osr)
+    finally:
+        board.close()
+    for name, value in capture.stats.items():
+        print(name, _format(value))
+    if args.output:
+        save(args.output, capture)
+    return 0
+
+
+def cmd_sweep(args, start=None) -> int:
+    """Sweep the setpoint grid over both boards and save the results."""
+    import sweep
+    ftx = _open("ftx", args.adapter, args.frequency, args.trace) if args.ftx_atten or args.laser else None
+    frx = _open("frx", args.adapter, args.frequency, args.trace)
+    axes = {}
+    for name, text in (("ftx_atten", args.ftx_atten), ("ld_current", args.laser), ("frx_atten", args.frx_atten)):
+        if text:
+            axes[name] = sweep.parse_axis(text)
+
+    def progress(i, total):
+        sys.stderr.write("\r{}/{}".format(i, total))
+
+    t0 = time.perf_counter()
+    try:
+        results = sweep.run(ftx, frx, progress=progress, timeout=args.settle_timeout, **axes)
+    finally:
+        for board in (ftx, frx):
+            if board is not None:
+                board.close()
+    sys.stderr.write("\n{} points in {:.1f} s, {} not settled\n".format(
+        len(results), time.perf_counter() - t0, int((~results["settled"]).sum())))
+    sweep.save(args.output, results)
+    return 0
+
+
+def cmd_profile(args, start=None) -> int:
+    """Apply a profile file to the boards of one adapter, or of every adapter in parallel."""
+    import profiles
+    from fleet import DeviceManager
+    table = profiles.load(args.file)
+    manager = DeviceManager()
+    try:
+        if args.adapter:
+            for kind in ("ftx", "frx"):
+                manager.add((args.adapter, kind), _open(kind, args.adapter, args.frequency, args.trace))
+        else:
+            manager.scan()
+        t0 = time.perf_counter()
+        results = manager.apply_profiles(table)
+        failed = 0
+        for (key, kind), result in sorted(results.items()):
+            if isinstance(result, Exception):
+                failed += 1
+                print(key, kind, "error", result)
+            elif result is None:
+                print(key, kind, "no profile")
+            else:
+                failed += bool(result["mismatch"])
+                print(key, kind, "wrote", ",".join(result["written"]) or "nothing",
+                      " ".join(name + "=" + _format(value) for name, value in result["readback"].items()),
+                      "MISMATCH " + ",".join(result["mismatch"]) if result["mismatch"] else "")
+        sys.stderr.write("{} boards in {:.2f} s\n".format(len(results), time.perf_counter() - t0))
+    finally:
+        manager.close()
+    return 1 if failed else 0
+
+
+def cmd_history(args, start=None) -> int:
+    """Print the stored history of one monitor of one board as time,value[,min,max] lines."""
+    import store
+    db = store.connect(args.db)
+    try:
+        if not args.serial:
+            for serial, kind, name in store.channels(db):
+                print(serial, kind, name)
+            return 0
+        if not args.name:
+            sys.stderr.write("history needs a monitor name\n")
+            return 2
+        now = time.time()
+        try:
+            data = store.query(db, args.serial, args.name, start=now - store.parse_age(args.since), end=now,
+                               resolution=args.resolution)
+        except KeyError:
+            sys.stderr.write("No history of " + args.name + " for board " + args.serial + "\n")
+            return 1
+    finally:
+        db.close()
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        columns = [c for c in ("time", "value", "min", "max") if c in data]
+        out.write(",".join(columns) + "\n")
+        for row in zip(*(data[c] for c in columns)):
+            out.write("{:.3f},".format(row[0]) + ",".join("{:.4g}".format(v) for v in row[1:]) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def cmd_probe(args, start=None) -> int:
+    """Find the fastest I2C clock each board reads back reliably at."""
+    for kind in args.boards:
+        board = _open(kind, args.adapter, args.frequency, args.trace)
+        try:
+            best, results = board.probe_frequency(rounds=args.rounds)
+        finally:
+            board.close()
+        for frequency, errors in results.items():
+            print(kind, "{:.0f}".format(frequency), errors, "errors")
+        print(kind, "best", "none" if best is None else "{:.0f}".format(best))
+    return 0
+
+
+def cmd_replay(args, start=None) -> int:
+    """Run the monitor path against a recorded I2C trace and report its speed."""
+    from i2ctrace import ReplayError, replay_board
+    board = replay_board(args.trace, strict=args.strict)
+    board.connect()
+    # The LNA monitors are only read while the LNA is enabled
+    board.lna_enabled = args.lna
+    t0 = time.perf_counter()
+    n = 0
+    values = {}
+    try:
+        while n < args.count:
+            values = _read(board)
+            n += 1
+    except (OSError, ReplayError) as e:
+        sys.stderr.write("Stopped after {} readings: {}\n".format(n, e))
+    elapsed = time.perf_counter() - t0
+    for name, value in values.items():
+        print(name, _format(value))
+    sys.stderr.write("{} readings, {} transactions in {:.3f} s, {:.0f} readings/s\n".format(
+        n, board.i2c.transactions, elapsed, n / elapsed if elapsed else 0.0))
+    return 0
+
+
+def cmd_serve(args, start=None) -> int:
+    import server
+    argv = ["--host", args.host, "--port", str(args.port)]
+    if args.unix:
+        argv += ["--unix", args.unix]
+    if args.simulate:
+        argv.append("--simulate")
+    return server.main(argv)
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="USBcontrol", description="Headless FTX/FRX control.")
+    parser.add_argument("--adapter", help="USB serial (or bus path) of the adapter to use")
+    parser.add_argument("--stats", help="write the I2C transaction statistics to this JSON file on exit")
+    parser.add_argument("--frequency", type=float, help="I2C clock in Hz, see the probe command")
+    parser.add_argument("--trace", metavar="PREFIX", help="record the raw I2C traffic to PREFIX_<board>.i2ct")
+    parser.add_argument("--calibration", help="JSON calibration constants per board kind or serial, see monitors.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("get", help="read the monitor values of one board")
+    p.add_argument("board", choices=("ftx", "frx"))
+    p.add_argument("names", nargs="*", help="only print these values")
+    p.set_defaults(func=cmd_get)
+
+    p = sub.add_parser("set", help="apply a setpoint and print the read back value")
+    p.add_argument("board", choices=("ftx", "frx"))
+    p.add_argument("setting", choices=SETTINGS)
+    p.add_argument("value")
+    p.set_defaults(func=cmd_set)
+
+    p = sub.add_parser("monitor", help="stream monitor values")
+    p.add_argument("--boards", nargs="+", choices=("ftx", "frx"), default=["ftx", "frx"])
+    p.add_argument("--interval", type=float, default=2.0, help="seconds between readings")
+    p.add_argument("--count", type=int, help="stop after this many readings")
+    p.add_argument("--output", help="append to this file instead of stdout")
+    p.add_argument("--record", help="also record every sample to this binary telemetry file")
+    p.add_argument("--store", help="also store every sample in this history database")
+    p.add_argument("--alarms", nargs="?", const="", metavar="RULES",
+                   help="check the limit alarms, from a JSON rules file or the defaults in alarms.py. The "
+                        "LNA bias state can't be read back, so the LNA current isn't read here and its "
+                        "over-current rule never fires; the LNA fault rule does")
+    p.set_defaults(func=cmd_monitor)
+
+    p = sub.add_parser("capture", help="high rate burst capture of the RF monitor")
+    p.add_argument("board", choices=("ftx", "frx"))
+    p.add_argument("--samples", type=int, default=10000, help="buffer size, the most samples captured")
+    p.add_argument("--duration", type=float, help="stop after this many seconds")
+    p.add_argument("--osr", type=int, default=0, help="oversampling, averages 2**OSR conversions")
+    p.add_argument("--output", help="save times, codes and values to this .npz file")
+    p.set_defaults(func=cmd_capture)
+
+    p = sub.add_parser("sweep", help="sweep attenuation and laser current, recording RF and PD monitors")
+    p.add_argument("output", help=".npz file for the results")
+    p.add_argument("--ftx-atten", help="FTX input attenuation, START:STOP:STEP or a comma separated list")
+    p.add_argument("--laser", help="FTX laser current in mA, START:STOP:STEP or a comma separated list")
+    p.add_argument("--frx-atten", help="FRX output attenuation, START:STOP:STEP or a comma separated list")
+    p.add_argument("--settle-timeout", type=float, default=1.0, help="longest wait for a point to settle")
+    p.set_defaults(func=cmd_sweep)
+
+    p = sub.add_parser("history", help="query the history database, lists the channels without a serial")
+    p.add_argument("serial", nargs="?", help="board serial number")
+    p.add_argument("name", nargs="?", help="monitor name")
+    p.add_argument("--db", default="usbcontrol.db", help="history database file")
+    p.add_argument("--since", default="1d", help="how far back, e.g. 30m, 6h, 14d")
+    p.add_argument("--resolution", choices=("auto", "raw", "1m", "1h"), default="auto")
+    p.add_argument("--output", help="write to this CSV file instead of stdout")
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("profile", help="apply a configuration profile file to every board")
+    p.add_argument("file", help="JSON profiles keyed by board serial number, see profiles.py")
+    p.set_defaults(func=cmd_profile)
+
+    p = sub.add_parser("probe", help="find the fastest I2C clock each board runs reliably at")
+    p.add_argument("--boards", nargs="+", choices=("ftx", "frx"), default=["ftx", "frx"])
+    p.add_argument("--rounds", type=int, default=10, help="read-back checks per frequency")
+    p.set_defaults(func=cmd_probe)
+
+    p = sub.add_parser("replay", help="benchmark the monitor path against a recorded I2C trace")
+    p.add_argument("trace", help=".i2ct file recorded with --trace")
+    p.add_argument("--count", type=int, default=1000, help="monitor readings to run")
+    p.add_argument("--strict", action="store_true", help="require the exact recorded sequence of transactions")
+    p.add_argument("--lna", action="store_true", help="the trace was recorded with the LNA bias enabled")
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser("serve", help="share the boards with local clients over a socket, see server.py")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    p.add_argument("--simulate", action="store_true", help="use the simulated I2C bus")
+    p.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None, start=None) -> int:
+    args = make_parser().parse_args(argv)
+    try:
+        if args.calibration:
+            from monitors import load_calibration
+            load_calibration(args.calibration)
+        return args.func(args, start=start)
+    except (OSError, ValueError) as e:
+        # Missing devices and files, and malformed calibration or profile files
+        sys.stderr.write(str(e) + "\n")
+        return 1
+    finally:
+        for board in _opened:
+            board.stop_trace()
+        if args.stats:
+            _dump_stats(args.stats)
+
+
+def _dump_stats(file_path) -> None:
+    import json
+    with open(file_path, "w") as f:
+        json.dump({board.kind: board.stats.snapshot() for board in _opened}, f, indent=2)
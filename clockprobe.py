@@ -0,0 +1,55 @@
+"""Find the fastest I2C clock a board runs reliably at.
+
+The board is reconnected at each candidate frequency, fastest first, and its bus
+is checked with read-backs whose result is known: test patterns written to a
+TLA2528 register and read back, and repeated reads of the serial number EEPROM
+and the attenuator expander through the board driver, at the addresses the
+driver uses, which must not change. The first frequency without a single error
+wins.
+"""
+from pyftdi.i2c import I2cIOError
+
+# Candidate I2C clocks in Hz, fastest first
+FREQUENCIES = (1000000.0, 400000.0, 100000.0)
+PATTERNS = (0x55, 0xAA, 0x0F, 0xF0, 0x00, 0xFF)
+# Driver getters whose result must not change while nothing is written
+STATIC_GETTERS = ("get_uid", "get_atten")
+
+
+def check_readback(board, rounds=10) -> int:
+    """Number of read-back errors over `rounds` rounds of checks on a connected board."""
+    errors = 0
+    reference = {getter: getattr(board.driver, getter)() for getter in STATIC_GETTERS}
+    for _ in range(rounds):
+        try:
+            if board.adc is not None:
+                errors += board.adc.check_readback(PATTERNS)
+            for getter, value in reference.items():
+                errors += getattr(board.driver, getter)() != value
+        except (TimeoutError, I2cIOError):
+            errors += 1
+    return errors
+
+
+def probe(board, frequencies=FREQUENCIES, rounds=10) -> tuple:
+    """Reconnect the board at each frequency and check it, fastest first.
+
+    Stops at the first frequency without errors and leaves the board connected at
+    it. Returns (that frequency or None, {frequency: errors} for every one tried).
+    """
+    results = {}
+    for frequency in frequencies:
+        board.close()
+        board.frequency = frequency
+        try:
+            board.connect()
+            errors = check_readback(board, rounds)
+        except (TimeoutError, I2cIOError):
+            errors = rounds
+        results[frequency] = errors
+        if not errors:
+            return frequency, results
+    board.close()
+    board.frequency = None
+    board.connect()
+    return None, results
@@ -0,0 +1,61 @@
+"""Bounded console log for the GUI.
+
+Messages go into a fixed size ring and are rendered into a single text widget,
+at most once per frame, showing only the last few lines. Every message is also
+written to a rotating log file by a background logging thread, so adding a
+message never waits on disk or on the GUI.
+"""
+from collections import deque
+import logging
+import logging.handlers
+import queue
+
+import dearpygui.dearpygui as dpg
+
+logger = logging.getLogger("usbcontrol")
+
+
+class Console:
+    """Ring buffer of console lines rendered into one DearPyGui text item.
+
+    add() can be called from any thread, render() must be called from the render loop.
+    """
+
+    def __init__(self, capacity=500, visible=50):
+        self.visible = visible
+        self._lines = deque(maxlen=capacity)
+        self._dirty = False
+        self._listener = None
+
+    def add(self, msg) -> None:
+        self._lines.append(str(msg))
+        self._dirty = True
+        logger.info(msg)
+
+    def lines(self) -> list:
+        return list(self._lines)
+
+    def render(self, text_item="console_text", window="console_window") -> None:
+        """Update the console widget if anything was added since the last frame."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        lines = list(self._lines)[-self.visible:]
+        dpg.set_value(text_item, "\n".join(lines))
+        dpg.set_y_scroll(window, dpg.get_y_scroll_max(window))
+
+    def start_logging(self, file_path="usbcontrol.log", max_bytes=1000000, backups=5) -> None:
+        """Write every message to a rotating log file from a background thread."""
+        log_queue = queue.SimpleQueue()
+        handler = logging.handlers.RotatingFileHandler(file_path, maxBytes=max_bytes, backupCount=backups)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self._listener = logging.handlers.QueueListener(log_queue, handler)
+        self._listener.start()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    def stop_logging(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
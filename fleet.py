@@ -0,0 +1,140 @@
+"""Fleet mode: every attached USB-I2C adapter and the FTX/FRX pair behind it.
+
+Each adapter is identified by its USB serial number (or bus path if it has none)
+and opens both I2C interfaces. Boards are polled in parallel on a bounded thread
+pool, so a full refresh takes about as long as the slowest board.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import usb.core
+import usb.util
+
+from acquisition import Board, FTX, FRX
+import profiles
+
+
+def adapter_key(dev) -> str:
+    """Serial number of the adapter, or its bus path if the serial can't be read."""
+    try:
+        serial = usb.util.get_string(dev, dev.iSerialNumber) if dev.iSerialNumber else None
+    except (usb.core.USBError, ValueError):
+        serial = None
+    if serial:
+        return serial
+    path = ".".join(str(p) for p in (dev.port_numbers or ()))
+    return "{}-{}".format(dev.bus, path or dev.address)
+
+
+def find_adapters() -> dict:
+    """Every attached 0x0403:0x6048 adapter, keyed by adapter_key()."""
+    devices = usb.core.find(find_all=True, idVendor=Board.VID, idProduct=Board.PID)
+    return {adapter_key(dev): dev for dev in devices}
+
+
+class DeviceManager:
+    """Connects to and polls the FTX and FRX boards of every attached adapter.
+
+    Bus access to a board is serialized with its lock, so polls and setpoints
+    for the same board never interleave while different boards run in parallel.
+    """
+
+    def __init__(self, max_workers=8):
+        self.boards = {}  # (adapter key, kind) -> Board
+        self._locks = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fleet")
+
+    def scan(self) -> list:
+        """Connect to the boards of any adapter not already open.
+
+        Returns the (adapter key, kind) of each newly connected board.
+        """
+        added = []
+        for key, dev in find_adapters().items():
+            for kind in (FTX, FRX):
+                if (key, kind) in self.boards:
+                    continue
+                board = Board(kind, device=dev)
+                try:
+                    board.connect()
+                except OSError:
+                    # Unplugged, busy or not answering, the other adapters are still scanned
+                    board.close()
+                    continue
+                self.add((key, kind), board)
+                added.append((key, kind))
+        return added
+
+    def add(self, board_id, board) -> None:
+        """Manage an already connected board."""
+        self.boards[board_id] = board
+        self._locks[board_id] = threading.Lock()
+
+    def _run(self, board_id, func, *args):
+        with self._locks[board_id]:
+            return func(self.boards[board_id], *args)
+
+    def map(self, func, *args, board_ids=None) -> dict:
+        """Call func(board, *args) on every board in parallel.
+
+        Returns a dict of (adapter key, kind) to the result, or to the exception
+        raised for that board.
+        """
+        if board_ids is None:
+            board_ids = list(self.boards)
+        futures = {board_id: self._pool.submit(self._run, board_id, func, *args) for board_id in board_ids}
+        results = {}
+        for board_id, future in futures.items():
+            try:
+                results[board_id] = future.result()
+            except OSError as e:
+                # I2C errors and timeouts, and USB or FTDI errors of an adapter going away
+                results[board_id] = e
+        return results
+
+    def poll(self) -> dict:
+        """Read the monitors of every board in parallel, see Board.read_monitors()."""
+        return self.map(Board.read_monitors)
+
+    def supervise(self, engine) -> tuple:
+        """Poll every board, check the readings against an alarms.AlarmEngine in one batch
+        and run the protective actions of the alarms raised, in parallel.
+
+        Returns (readings as from poll(), alarms raised or cleared). If a protective
+        action fails, the board's reading is replaced by the exception.
+        """
+        readings = self.poll()
+        batch = {board_id: (board_id[1], values) for board_id, values in readings.items()
+                 if not isinstance(values, Exception)}
+        alarms = engine.evaluate(batch)
+        actions = [(alarm.board, self._pool.submit(self._run, alarm.board, getattr(Board, alarm.rule.action[0]),
+                                                   *alarm.rule.action[1:]))
+                   for alarm in alarms if alarm.active and alarm.rule.action]
+        for board_id, future in actions:
+            try:
+                future.result()
+            except OSError as e:
+                readings[board_id] = e
+        return readings, alarms
+
+    def apply(self, board_id, command, *args):
+        """Run a Board setpoint method on one board, serialized with its polls."""
+        return self._pool.submit(self._run, board_id, getattr(Board, command), *args).result()
+
+    def apply_profiles(self, table, wait=0.1) -> dict:
+        """Apply the matching profile of a profile table to every board in parallel.
+
+        All boards are written at once and wait out the settling time together,
+        so a full rack takes about as long as one board. See profiles.apply().
+        """
+        return self.map(profiles.apply_matching, table, wait)
+
+    def disconnect(self, board_id) -> None:
+        self._run(board_id, Board.close)
+        del self.boards[board_id]
+        del self._locks[board_id]
+
+    def close(self) -> None:
+        for board_id in list(self.boards):
+            self.disconnect(board_id)
+        self._pool.shutdown()
@@ -1,15 +1,40 @@
 import dearpygui.dearpygui as dpg
-from pyftdi.i2c import I2cController, I2cIOError, I2cTimeoutError
-from rfof import Ftx
-from rfof import Frx
-import usb.core
-import usb.util
+import os
+import queue
 import time
 
+import burst
+import profiles
+from console import Console
+from acquisition import AcquisitionWorker, FTX, FRX, EVENT_LOG, EVENT_CONNECTED, EVENT_DISCONNECTED, EVENT_MONITOR, \
+    EVENT_SETPOINT, EVENT_ALARM
+from adapter import Adapter
+from alarms import AlarmEngine, describe
+from history import TrendHistory
+from hotplug import UsbWatcher
+from monitors import GETTERS, load_calibration, to_engineering
+from recorder import Recorder
+from regcache import UID
+from state import BoardState
+from store import TelemetryStore
+
+
+# Time spans offered in the trends window, in seconds
+TREND_SPANS = {"1 min": 60, "10 min": 600, "1 h": 3600, "6 h": 21600, "24 h": 86400}
+TREND_UNITS = {"temp": "degC", "ld_current": "mA", "pd_current": "uA/mA", "rf_power": "dBm", "vdd": "V",
+               "vdda": "V", "lna_current": "mA", "lna_voltage": "V"}
+
+# Control inputs enabled while each board is connected
+CONTROLS = {FTX: ("lna_bias_checkbox", "ftx_input_attn", "ftx_laser_current"), FRX: ("frx_output_attn",)}
+# Frame time once there has been no input and no new data for IDLE_AFTER seconds
+IDLE_AFTER = 1.0
+IDLE_FRAME_TIME = 0.1
+
+console = Console()
+
 
 def add_text_to_console(msg) -> None:
-    dpg.add_text(msg, parent="console_window")
-    dpg.set_y_scroll("console_window", dpg.get_y_scroll_max("console_window"))
+    console.add(msg)
 
 
 class UserInterface:
@@ -19,8 +44,27 @@ class UserInterface:
     def __init__(self):
         self.ftx = None
         self.frx = None
-        self.i2c_receive = None
-        self.i2c_transmit = None
+        # Results from the acquisition workers, drained once per frame
+        self.events = queue.SimpleQueue()
+        # Limit alarms, checked by the workers as the readings arrive
+        self.alarms = AlarmEngine()
+        # Both boards share the one USB device lookup of the adapter
+        self.adapter = Adapter()
+        self.workers = {
+            FTX: AcquisitionWorker(self.adapter.board(FTX), self.events, alarms=self.alarms),
+            FRX: AcquisitionWorker(self.adapter.board(FRX), self.events, alarms=self.alarms),
+        }
+        # Decimated history of every monitor for the trend plots
+        self.trends = TrendHistory()
+        for worker in self.workers.values():
+            worker.listeners.append(self.trends)
+        # Device state, diffed against new readings so only changed fields reach the widgets
+        self.states = {FTX: BoardState(FTX), FRX: BoardState(FRX)}
+        for board_state in self.states.values():
+            board_state.subscribe(self._apply_state)
+        self._monitor_widgets = {}
+        self._last_activity = time.monotonic()
+        self._bus_stats_text = None
         self._lna_current_id = 0
         self._lna_voltage_id = 0
         self._laser_current_id = 0
@@ -38,7 +82,10 @@ class UserInterface:
         self._frx_attn_id = 0
         self.comments = ""
         self.opt_attn = "None"
+        self.recorder = None
+        self.history_store = None
 
+        console.start_logging()
         dpg.create_context()
         dpg.create_viewport(title='USB-I2C Control Program', width=845, height=630)
         dpg.setup_dearpygui()
@@ -47,38 +94,166 @@ class UserInterface:
         dpg.set_primary_window("primary_window", True)
         dpg.show_viewport()
         dpg.set_viewport_resizable(False)
-        ti = dpg.get_total_time()
+        for worker in self.workers.values():
+            worker.start()
+        # Reconnect the boards as soon as the adapter is plugged back in
+        self.usb_watcher = UsbWatcher(self._on_usb_changed)
+        self.usb_watcher.start()
+        stats_time = dpg.get_total_time()
         while dpg.is_dearpygui_running():
-            tf = dpg.get_total_time()
-            if (tf - ti) > 2:  # approx 2 second intervals
-                ti = tf
-                self._timer_callback()
+            if self._drain_events():
+                self._last_activity = time.monotonic()
+            if dpg.get_total_time() - stats_time > 1:
+                stats_time = dpg.get_total_time()
+                self._update_bus_stats()
+                self._update_trends()
+            console.render()
             dpg.render_dearpygui_frame()
+            if time.monotonic() - self._last_activity > IDLE_AFTER:
+                # Nothing is happening, drop to a low frame rate
+                time.sleep(IDLE_FRAME_TIME)
         dpg.destroy_context()
 
-    def _timer_callback(self) -> None:
-        """Timer callback that runs approx every 2 second.
-
-        If the frx or ftx is connected, this will refresh the
-        monitor data"""
-        if self.frx is not None:
-            self._update_mon_frx()
-
-        if self.ftx is not None:
-            self._update_mon_ftx()
+    def _on_usb_changed(self, added, removed) -> None:
+        """Called by the USB watcher thread when adapters are plugged in or unplugged."""
+        if removed:
+            self.adapter.forget()
+        for worker in self.workers.values():
+            worker.submit("usb_changed", added, removed)
+
+    def _on_input(self, sender=None, data=None) -> None:
+        """Handler for any mouse or keyboard input, keeps the render loop at full rate."""
+        self._last_activity = time.monotonic()
+
+    def _drain_events(self) -> bool:
+        """Handle everything the acquisition workers posted since the last frame.
+
+        The workers do all the I2C transactions (scheduled monitor reads and setpoint
+        changes), so the render loop never blocks on the bus. Returns True if anything
+        changed on screen: a monitor reading that changes a displayed value, or any
+        other event. Readings that change nothing (the LNA fault input is polled
+        several times a second) don't keep the render loop at full rate.
+        """
+        active = False
+        while True:
+            try:
+                event, kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                return active
+            if event == EVENT_MONITOR:
+                if self.states[kind].update(to_engineering(kind, payload)):
+                    active = True
+                continue
+            active = True
+            if event == EVENT_LOG:
+                add_text_to_console(payload)
+            elif event == EVENT_CONNECTED:
+                self._on_connected(kind)
+            elif event == EVENT_DISCONNECTED:
+                self._on_disconnected(kind, payload)
+            elif event == EVENT_SETPOINT:
+                self._on_setpoint(kind, *payload)
+            elif event == EVENT_ALARM:
+                self._on_alarm(kind, payload)
+
+    def _update_bus_stats(self) -> None:
+        """Refresh the bus statistics panel from the counters kept by each board, if they changed."""
+        lines = []
+        for kind, worker in self.workers.items():
+            lines.append(kind.upper())
+            lines.extend(worker.board.stats.summary() or ["  no transactions"])
+        text = "\n".join(lines)
+        if text != self._bus_stats_text:
+            dpg.set_value("bus_stats_text", text)
+            self._bus_stats_text = text
+
+    def _update_trends(self) -> None:
+        """Redraw the trend plots from the decimated history, if the trends window is open."""
+        if not dpg.is_item_shown("trends_window"):
+            return
+        window = TREND_SPANS[dpg.get_value("trend_span")]
+        now = time.time()
+        for (kind, name), history in list(self.trends.signals.items()):
+            series = "trend_" + kind + "_" + name
+            if not dpg.does_item_exist(series):
+                continue
+            t, values = history.query(window, now=now)
+            dpg.set_value(series, [(t - now).tolist(), values.tolist()])
+            dpg.set_axis_limits("trend_x_" + kind + "_" + name, -window, 0)
+            dpg.fit_axis_data("trend_y_" + kind + "_" + name)
 
     def _exit_callback(self) -> None:
         """Exit callback when the application is closed.
 
-        If there is a running connection to the machine, call the exit function on the SA to
+        Stops the acquisition workers, which close any open I2C connection to
         ensure we terminate the session properly.
         """
         if self.frx is not None:
             add_text_to_console("Disconnecting from FRX board...")
-            self.i2c_receive.close()
         if self.ftx is not None:
             add_text_to_console("Disconnecting from FTX board...")
-            self.i2c_transmit.close()
+        self.usb_watcher.stop()
+        for worker in self.workers.values():
+            worker.stop()
+        for worker in self.workers.values():
+            worker.join(timeout=2)
+            worker.board.stop_trace()
+        console.stop_logging()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.history_store is not None:
+            self.history_store.close()
+
+    def _record_checked(self, sender) -> None:
+        """Callback for the Record Telemetry menu item.
+
+        Starts or stops streaming every polled sample to a timestamped .bin file.
+        """
+        if dpg.get_value(sender):
+            file_path = time.strftime("telemetry_%Y%m%d_%H%M%S.bin", time.localtime())
+            self.recorder = Recorder(file_path)
+            for worker in self.workers.values():
+                worker.listeners.append(self.recorder)
+            add_text_to_console("Recording telemetry to " + file_path + "...")
+        elif self.recorder is not None:
+            for worker in self.workers.values():
+                worker.listeners.remove(self.recorder)
+            self.recorder.close()
+            add_text_to_console("Telemetry recording stopped.")
+            self.recorder = None
+
+    def _store_checked(self, sender) -> None:
+        """Callback for the Store History menu item.
+
+        Starts or stops storing every polled sample in the history database, see store.py.
+        """
+        if dpg.get_value(sender):
+            self.history_store = TelemetryStore("usbcontrol.db")
+            for worker in self.workers.values():
+                worker.listeners.append(self.history_store)
+            add_text_to_console("Storing monitor history in usbcontrol.db...")
+        elif self.history_store is not None:
+            for worker in self.workers.values():
+                worker.listeners.remove(self.history_store)
+            self.history_store.close()
+            add_text_to_console("Monitor history storage stopped.")
+            self.history_store = None
+
+    def _trace_checked(self, sender) -> None:
+        """Callback for the Record I2C Trace menu item.
+
+        Starts or stops recording the raw bus traffic of the connected boards to timestamped .i2ct files.
+        """
+        for worker in self.workers.values():
+            if not worker.board.connected:
+                continue
+            if dpg.get_value(sender):
+                file_path = time.strftime(worker.board.kind + "_trace_%Y%m%d_%H%M%S.i2ct", time.localtime())
+                worker.submit("start_trace", file_path)
+                add_text_to_console("Recording " + worker.board.name + " I2C traffic to " + file_path + "...")
+            else:
+                worker.submit("stop_trace")
+                add_text_to_console(worker.board.name + " I2C trace stopped.")
 
     def save_data(self, file_path):
         # TODO: update for new monitor fields
@@ -113,40 +288,79 @@ class UserInterface:
             f.write('FRX SN,' + dpg.get_value(self._frx_sn_id) + ',,Mon\n')
         add_text_to_console("Done.")
 
-    def _connect_frx(self, sender=None, data=None) -> None:
-        """Callback for clicking the connect button.
-
-        Calls the configure function on the I2C ports.
-        """
-        self.i2c_receive = I2cController()
-        dev = usb.core.find(idVendor=0x0403, idProduct=0x6048)
-        # dev = usb.core.find(idVendor=1027, idProduct=24592)  # Tigard
-        if dev is None:
-            add_text_to_console('USB Device not found!')
+    def _load_profile_callback(self, sender, app_data) -> None:
+        """Apply the profiles in a file to every connected board, in parallel on their workers."""
+        file_path = app_data.get('file_path_name')
+        try:
+            table = profiles.load(file_path)
+        except (OSError, ValueError) as e:
+            add_text_to_console("Could not load profile " + file_path + ": " + str(e))
             return
+        for worker in self.workers.values():
+            if worker.board.connected:
+                add_text_to_console("Applying profile to the " + worker.board.name + " board...")
+                worker.submit("apply_profile", table)
+
+    def _load_calibration_callback(self, sender, app_data) -> None:
+        """Use the calibration constants in a file for every reading from now on."""
+        file_path = app_data.get('file_path_name')
         try:
-            self.i2c_receive.configure(dev, interface=1)
-            # self.i2c_receive.configure(dev, interface=2)
-            self.frx = Frx(self.i2c_receive)
-        except I2cIOError:
-            # Log the error to the console
-            add_text_to_console("Could not connect to FRX board, check connection and try again.")
+            load_calibration(file_path)
+        except (OSError, ValueError) as e:
+            add_text_to_console("Could not load calibration " + file_path + ": " + str(e))
             return
+        add_text_to_console("Calibration loaded from " + file_path + ".")
 
-        add_text_to_console("Connected to the FRX board. Control fields are now enabled.")
-
-        dpg.configure_item("frx_connect_button", show=False)
-        dpg.configure_item("frx_disconnect_button", show=True)
-        # Enable all the control inputs
-        dpg.configure_item("frx_output_attn", enabled=True)
+    def _save_profile_callback(self, sender, app_data) -> None:
+        """Save the setpoints of the connected boards to a profile file, keyed by serial number."""
+        file_path = app_data.get('file_path_name')
+        try:
+            table = profiles.load(file_path) if os.path.exists(file_path) else {}
+        except (OSError, ValueError) as e:
+            add_text_to_console("Could not update profile " + file_path + ": " + str(e))
+            return
+        for worker in self.workers.values():
+            uid = worker.board.cache.peek(UID)
+            if worker.board.connected and uid is not None:
+                table[uid] = profiles.snapshot(worker.board)
+        try:
+            profiles.save(file_path, table)
+        except OSError as e:
+            add_text_to_console("Could not save profile " + file_path + ": " + str(e))
+            return
+        add_text_to_console("Profile saved to " + file_path + ".")
+
+    def _on_profile(self, kind, result, restored=False) -> None:
+        """Called once a worker has applied a profile, or restored the setpoints after
+        reconnecting, updates the controls and monitors."""
+        name = kind.upper()
+        if result is None:
+            add_text_to_console("No profile for the " + name + " board.")
+            return
+        if restored:
+            add_text_to_console(name + " setpoints restored: " + ", ".join(result["written"]) + ".")
+        elif not result["written"]:
+            add_text_to_console(name + " board already matches its profile.")
+        else:
+            add_text_to_console(name + " profile applied: " + ", ".join(result["written"]) + ".")
+        for setting, value in result["mismatch"].items():
+            add_text_to_console("**WARNING** " + name + " " + setting + " read back as " + str(round(value, 2)) + ".")
+        profile = profiles.snapshot(self.workers[kind].board)
+        if kind == FTX:
+            controls = {"atten": "ftx_input_attn", "ld_current": "ftx_laser_current", "lna_enable": "lna_bias_checkbox"}
+        else:
+            controls = {"atten": "frx_output_attn"}
+        for setting, control in controls.items():
+            if setting in profile:
+                dpg.set_value(control, profile[setting])
+        self.states[kind].update(dict(result["readback"], lna_enabled=profile.get("lna_enable", False)))
 
-        dpg.configure_item(self._frx_sn_id, color=(255, 255, 255))
-        dpg.configure_item(self._frx_rfmon_id, color=(255, 255, 255))
-        dpg.configure_item(self._pd_current_id, color=(255, 255, 255))
-        dpg.configure_item(self._temp_id, color=(255, 255, 255))
-        dpg.configure_item(self._frx_attn_id, color=(255, 255, 255))
+    def _connect_frx(self, sender=None, data=None) -> None:
+        """Callback for clicking the connect button.
 
-        self._update_mon_frx()
+        Asks the FRX acquisition worker to configure the I2C port.
+        """
+        self.workers[FRX].submit("connect")
 
     def _save_callback(self, sender, app_data) -> None:
         self.save_data(app_data.get('file_path_name'))
@@ -154,86 +368,58 @@ class UserInterface:
     def _connect_ftx(self, sender=None, data=None) -> None:
         """Callback for clicking the connect button.
 
-        Calls the configure function on the I2C ports.
+        Asks the FTX acquisition worker to configure the I2C port.
         """
+        self.workers[FTX].submit("connect")
 
-        dev = usb.core.find(idVendor=0x0403, idProduct=0x6048)  # Custom
-        # dev = usb.core.find(idVendor=1027, idProduct=24592)  # Tigard
-        if dev is None:
-            add_text_to_console("Could not find the USB device, check connection and try again.")
-            return
-
-        self.i2c_transmit = I2cController()
-        try:
-            self.i2c_transmit.configure(dev, interface=2)
-            self.ftx = Ftx(self.i2c_transmit)
-        except I2cIOError:
-            # Log the error to the console
-            add_text_to_console("Could not connect to FTX board, check connection and try again.")
-            return
-
-        add_text_to_console("Connected to the FTX board. Control fields are now enabled.")
-        dpg.configure_item("ftx_connect_button", show=False)
-        dpg.configure_item("ftx_disconnect_button", show=True)
-        # Enable all the control inputs
-        dpg.configure_item("lna_bias_checkbox", enabled=True)
-        dpg.configure_item("ftx_input_attn", enabled=True)
-        dpg.configure_item("ftx_laser_current", enabled=True)
-
-        dpg.configure_item(self._ftx_sn_id, color=(255, 255, 255))
-        dpg.configure_item(self._ftx_rfmon_id, color=(255, 255, 255))
-        # dpg.configure_item(self._lna_current_id, color=(255, 255, 255))
-        dpg.configure_item(self._laser_current_id, color=(255, 255, 255))
-        dpg.configure_item(self._laserpd_mon_id, color=(255, 255, 255))
-        dpg.configure_item(self._ftx_temp_id, color=(255, 255, 255))
-        dpg.configure_item(self._ftx_vdda_id, color=(255, 255, 255))
-        dpg.configure_item(self._ftx_vdd_id, color=(255, 255, 255))
-        dpg.configure_item(self._ftx_attn_id, color=(255, 255, 255))
-        # dpg.configure_item(self._lna_voltage_id, color=(255, 255, 255))
-
-        self._update_mon_ftx()
+    def _on_connected(self, kind) -> None:
+        """Called once a worker has connected to its board."""
+        if kind == FTX:
+            self.ftx = self.workers[FTX].board
+        else:
+            self.frx = self.workers[FRX].board
+        add_text_to_console("Connected to the " + kind.upper() + " board. Control fields are now enabled.")
+        self.states[kind].update({"connected": True})
 
     def _disconnect_ftx(self, sender=None, data=None) -> None:
         """Callback for clicking the disconnect button.
 
-        Calls the disconnect function on the SA to terminate the session.
+        Asks the FTX acquisition worker to close the I2C port.
         """
-        dpg.configure_item("ftx_connect_button", show=True)
-        dpg.configure_item("ftx_disconnect_button", show=False)
-        self.i2c_transmit.close()
-        add_text_to_console("FTX board connection closed. OK to unplug.")
-        self.ftx = None
-        # Disable all the settings inputs
-        dpg.configure_item("lna_bias_checkbox", enabled=False)
-        dpg.configure_item("ftx_input_attn", enabled=False)
-        dpg.configure_item("ftx_laser_current", enabled=False)
-        dpg.configure_item(self._ftx_sn_id, color=(37, 37, 37))
-        dpg.configure_item(self._ftx_rfmon_id, color=(37, 37, 37))
-        dpg.configure_item(self._lna_current_id, color=(37, 37, 37))
-        dpg.configure_item(self._laser_current_id, color=(37, 37, 37))
-        dpg.configure_item(self._laserpd_mon_id, color=(37, 37, 37))
-        dpg.configure_item(self._ftx_temp_id, color=(37, 37, 37))
-        dpg.configure_item(self._ftx_vdda_id, color=(37, 37, 37))
-        dpg.configure_item(self._ftx_vdd_id, color=(37, 37, 37))
-        dpg.configure_item(self._ftx_attn_id, color=(37, 37, 37))
-        dpg.configure_item(self._lna_voltage_id, color=(37, 37, 37))
+        self.workers[FTX].submit("disconnect")
 
     def _disconnect_frx(self, sender=None, data=None) -> None:
         """Callback for clicking the disconnect button.
 
-        Calls the disconnect function on the SA to terminate the session.
+        Asks the FRX acquisition worker to close the I2C port.
         """
-        dpg.configure_item("frx_connect_button", show=True)
-        dpg.configure_item("frx_disconnect_button", show=False)
-        self.i2c_receive.close()
-        self.frx = None
-        # Disable all the settings inputs
-        dpg.configure_item("frx_output_attn", enabled=False)
-        dpg.configure_item(self._frx_sn_id, color=(37, 37, 37))
-        dpg.configure_item(self._frx_rfmon_id, color=(37, 37, 37))
-        dpg.configure_item(self._pd_current_id, color=(37, 37, 37))
-        dpg.configure_item(self._temp_id, color=(37, 37, 37))
-        dpg.configure_item(self._frx_attn_id, color=(37, 37, 37))
+        self.workers[FRX].submit("disconnect")
+
+    def _on_disconnected(self, kind, reason=None) -> None:
+        """Called once a worker has closed its board connection, reason is "lost" if the link was lost."""
+        if kind == FTX:
+            if reason is None:
+                add_text_to_console("FTX board connection closed. OK to unplug.")
+            self.ftx = None
+            dpg.set_value("lna_bias_checkbox", False)
+        else:
+            self.frx = None
+        self.states[kind].reset()
+        self.states[kind].update({"connected": False, "lna_enabled": False})
+
+    def _show_connected(self, kind, connected) -> None:
+        """Show or hide the connect buttons, enable or disable the controls and grey out the monitors."""
+        dpg.configure_item(kind + "_connect_button", show=not connected)
+        dpg.configure_item(kind + "_disconnect_button", show=connected)
+        # Enable or disable all the control inputs
+        for control in CONTROLS[kind]:
+            dpg.configure_item(control, enabled=connected)
+        color = (255, 255, 255) if connected else (37, 37, 37)
+        for name, widget in self._monitor_widgets[kind].items():
+            # The LNA monitors follow the LNA bias enable instead
+            if connected and name in ("lna_current", "lna_voltage"):
+                continue
+            dpg.configure_item(widget, color=color)
 
     def _show_popup_window(self, sender=None, data=None, user_data=None) -> None:
         """Callback for when certain buttons are clicked.
@@ -273,93 +459,110 @@ class UserInterface:
         If turned off, sends the lna bias disable command
         """
         value = dpg.get_value(sender)
-        self.ftx.set_lna_enable(value)
-        if value:
-            add_text_to_console("LNA bias enabled.")
-            dpg.configure_item(self._lna_current_id, color=(255, 255, 255))
-            dpg.configure_item(self._lna_voltage_id, color=(255, 255, 255))
-            try:
-                dpg.set_value(self._lna_current_id, "{:.2f}".format(self.ftx.get_lna_current()))
-                dpg.set_value(self._lna_voltage_id, "{:.2f}".format(self.ftx.get_lna_voltage()))
-            except TimeoutError:
-                add_text_to_console("Timeout while reading LNA current and voltage.")
-        else:
-            add_text_to_console("LNA bias disabled.")
-            dpg.configure_item(self._lna_current_id, color=(37, 37, 37))
-            dpg.configure_item(self._lna_voltage_id, color=(37, 37, 37))
+        self.workers[FTX].submit("set_lna_enable", value)
 
     def _update_ftx_attn(self) -> None:
         new_value = dpg.get_value("ftx_input_attn")
-        self.ftx.set_atten(new_value)
         add_text_to_console("Setting input attenuation to " + str(new_value) + "...")
-        time.sleep(0.1)
-        try:
-            set_value = self.ftx.get_atten()
-            dpg.set_value("ftx_attn", set_value)
-            if new_value != set_value:
-                add_text_to_console(
-                    "**WARNING** Value input: " + str(round(new_value, 2)) + ", value set: " + str(set_value) + ".")
-        except TimeoutError:
-            add_text_to_console("Timeout while reading FTX attenuation value.")
+        self.workers[FTX].submit("set_atten", new_value)
 
     def _update_ftx_laser(self) -> None:
         new_value = dpg.get_value("ftx_laser_current")
-        self.ftx.set_ld_current(new_value)
         add_text_to_console("Setting laser current to " + str(new_value) + "...")
-        time.sleep(0.1)
-        try:
-            set_value = self.ftx.get_ld_current()
-            dpg.set_value("ftx_laser_current_mon", set_value)
-            if new_value != set_value:
-                add_text_to_console("**WARNING** Value input: "+str(round(new_value, 2))+", value set: "+str(set_value)+".")
-        except TimeoutError:
-            add_text_to_console("Timeout while reading Laser Diode current.")
+        self.workers[FTX].submit("set_ld_current", new_value)
 
     def _update_frx_attn(self) -> None:
         new_value = dpg.get_value("frx_output_attn")
-        self.frx.set_atten(new_value)
         add_text_to_console("Setting output attenuation to " + str(new_value) + "...")
-        time.sleep(0.1)
-        try:
-            set_value = self.frx.get_atten()
-            dpg.set_value(self._frx_attn_id, set_value)
-            if new_value != set_value:
-                add_text_to_console("**WARNING** Value input: " + str(round(new_value, 2)) + ", value set: " +
-                                    str(set_value) + ".")
-        except TimeoutError:
-            add_text_to_console("Timeout while reading FRX attenuation value.")
-
-    def _update_mon_frx(self) -> None:
-        """ Reads all the monitor data and updates the
-            display accordingly. Called every 2 seconds.
-        """
-        try:
-            dpg.set_value(self._frx_rfmon_id, "{:.2f}".format(self.frx.get_rf_power()))
-            dpg.set_value(self._pd_current_id, "{:.2f}".format(self.frx.get_pd_current()))
-            dpg.set_value(self._frx_sn_id, self.frx.get_uid())
-            dpg.set_value(self._temp_id, "{:.2f}".format(self.frx.get_temp()))
-            dpg.set_value(self._frx_attn_id, "{:.2f}".format(self.frx.get_atten()))
-        except TimeoutError:
-            add_text_to_console("Timeout while updating FRX monitor values.")
-
-    def _update_mon_ftx(self) -> None:
-        """ Reads all the monitor data and updates the
-            display accordingly
-        """
-        try:
-            if dpg.get_value("lna_bias_checkbox"):
-                dpg.set_value(self._lna_current_id, "{:.2f}".format(self.ftx.get_lna_current()))
-                dpg.set_value(self._lna_voltage_id, "{:.2f}".format(self.ftx.get_lna_voltage()))
-            dpg.set_value(self._laser_current_id, "{:.2f}".format(self.ftx.get_ld_current()))
-            dpg.set_value(self._laserpd_mon_id, "{:.2f}".format(self.ftx.get_pd_current()))
-            dpg.set_value(self._ftx_sn_id, self.ftx.get_uid())
-            dpg.set_value(self._ftx_rfmon_id, "{:.2f}".format(self.ftx.get_rf_power()))
-            dpg.set_value(self._ftx_attn_id, "{:.2f}".format(self.ftx.get_atten()))
-            dpg.set_value(self._ftx_temp_id, "{:.2f}".format(self.ftx.get_temp()))
-            dpg.set_value(self._ftx_vdda_id, "{:.2f}".format(self.ftx.get_vdda_voltage()))
-            dpg.set_value(self._ftx_vdd_id, "{:.2f}".format(self.ftx.get_vdd_voltage()))
-        except TimeoutError:
-            add_text_to_console("Timeout while reading FTX monitor values.")
+        self.workers[FRX].submit("set_atten", new_value)
+
+    def _capture_rf(self, sender=None, data=None, user_data=None) -> None:
+        """Callback for the RF burst capture menu items, user_data is the board kind."""
+        if self.workers[user_data].board.connected:
+            add_text_to_console("Capturing " + user_data.upper() + " RF monitor burst...")
+            self.workers[user_data].submit("capture_rf", 10000)
+
+    def _probe_frequency(self, sender=None, data=None) -> None:
+        """Callback for the Probe I2C Clock menu item, finds the fastest reliable clock of each connected board."""
+        for worker in self.workers.values():
+            if worker.board.connected:
+                add_text_to_console("Probing the " + worker.board.name + " I2C clock...")
+                worker.submit("probe_frequency")
+
+    def _on_probe(self, kind, result) -> None:
+        best, errors = result
+        tried = ", ".join("{:.0f} kHz: {} errors".format(f / 1000, n) for f, n in errors.items())
+        if best is None:
+            add_text_to_console("**WARNING** No reliable " + kind.upper() + " I2C clock found (" + tried + ").")
+        else:
+            add_text_to_console(kind.upper() + " I2C clock set to {:.0f} kHz ({}).".format(best / 1000, tried))
+
+    def _on_capture(self, capture) -> None:
+        file_path = time.strftime(capture.kind + "_rf_burst_%Y%m%d_%H%M%S.npz", time.localtime())
+        burst.save(file_path, capture)
+        s = capture.stats
+        if not s["samples"]:
+            add_text_to_console("RF burst capture returned no samples.")
+            return
+        add_text_to_console("{} samples at {:.0f} S/s: mean {:.2f}, std {:.3f}, min {:.2f}, max {:.2f} dBm. "
+                            "Saved to {}".format(s["samples"], s["rate"], s["mean"], s["std"], s["min"], s["max"],
+                                                 file_path))
+
+    def _on_alarm(self, kind, alarm) -> None:
+        """Called when a limit alarm is raised or cleared, shows it in the console and on the monitor."""
+        add_text_to_console(describe(alarm))
+        if alarm.active and alarm.rule.action:
+            add_text_to_console("Protective action: " + alarm.rule.action[0] + " " +
+                                " ".join(str(arg) for arg in alarm.rule.action[1:]) + ".")
+        widget = self._monitor_widgets[kind].get(alarm.rule.name)
+        if widget is not None:
+            dpg.configure_item(widget, color=(255, 80, 80) if alarm.active else (255, 255, 255))
+
+    def _on_setpoint(self, kind, command, args, result) -> None:
+        """Called with the read back value once a worker has applied a setpoint."""
+        if command == "capture_rf":
+            self._on_capture(result)
+            return
+        if command == "probe_frequency":
+            self._on_probe(kind, result)
+            return
+        if command in ("start_trace", "stop_trace"):
+            return
+        if command in ("apply_profile", "restore"):
+            self._on_profile(kind, result, restored=command == "restore")
+            return
+        if command == "set_lna_enable":
+            add_text_to_console("LNA bias enabled." if args[0] else "LNA bias disabled.")
+            dpg.set_value("lna_bias_checkbox", bool(args[0]))
+            self.states[kind].update(dict(result, lna_enabled=bool(args[0])))
+            return
+
+        new_value = args[0]
+        if command == "set_ld_current":
+            self.states[kind].update({"ld_current": result})
+        else:
+            self.states[kind].update({"atten": result})
+        if new_value != result:
+            add_text_to_console("**WARNING** Value input: " + str(round(new_value, 2)) + ", value set: " +
+                                str(result) + ".")
+
+    def _apply_state(self, kind, changes) -> None:
+        """Push the fields of a board state that changed to their widgets."""
+        widgets = self._monitor_widgets[kind]
+        for name, value in changes.items():
+            if name == "connected":
+                self._show_connected(kind, value)
+            elif name == "lna_enabled":
+                color = (255, 255, 255) if value else (37, 37, 37)
+                dpg.configure_item(self._lna_current_id, color=color)
+                dpg.configure_item(self._lna_voltage_id, color=color)
+            elif name == "lna_fault":
+                if value:
+                    add_text_to_console("**WARNING** LNA fault input asserted.")
+            elif name == "uid":
+                dpg.set_value(widgets[name], value)
+            elif name in widgets:
+                dpg.set_value(widgets[name], "{:.2f}".format(value))
 
     def _make_gui(self) -> None:
         """Create the layout for the entire application."""
@@ -374,16 +577,41 @@ class UserInterface:
                              tag="save_as_dialog_id", width=700, height=400):
             dpg.add_file_extension(".csv", color=(0, 255, 0, 255), custom_text="[CSV]")
 
+        with dpg.file_dialog(directory_selector=False, show=False, callback=self._load_profile_callback,
+                             tag="load_profile_dialog", width=700, height=400):
+            dpg.add_file_extension(".json", color=(0, 255, 0, 255), custom_text="[Profile]")
+        with dpg.file_dialog(directory_selector=False, show=False, callback=self._save_profile_callback,
+                             tag="save_profile_dialog", width=700, height=400):
+            dpg.add_file_extension(".json", color=(0, 255, 0, 255), custom_text="[Profile]")
+
+        with dpg.file_dialog(directory_selector=False, show=False, callback=self._load_calibration_callback,
+                             tag="load_calibration_dialog", width=700, height=400):
+            dpg.add_file_extension(".json", color=(0, 255, 0, 255), custom_text="[Calibration]")
+
         with dpg.window(label="USB-I2C Control Program", tag="primary_window") as main:
             with dpg.menu_bar():
                 with dpg.menu(label="File"):
                     dpg.add_menu_item(label="Save Data", callback=lambda: dpg.show_item("save_as_dialog_id"))
+                    dpg.add_menu_item(label="Record Telemetry", check=True, callback=self._record_checked)
+                    dpg.add_menu_item(label="Store History", check=True, callback=self._store_checked)
+                    dpg.add_menu_item(label="Record I2C Trace", check=True, callback=self._trace_checked)
+                    dpg.add_menu_item(label="Load Profile", callback=lambda: dpg.show_item("load_profile_dialog"))
+                    dpg.add_menu_item(label="Load Calibration",
+                                      callback=lambda: dpg.show_item("load_calibration_dialog"))
+                    dpg.add_menu_item(label="Save Profile", callback=lambda: dpg.show_item("save_profile_dialog"))
+                    with dpg.menu(label="RF Burst Capture"):
+                        dpg.add_menu_item(label="FTX", callback=self._capture_rf, user_data=FTX)
+                        dpg.add_menu_item(label="FRX", callback=self._capture_rf, user_data=FRX)
 
                     with dpg.menu(label="Add..."):
                         dpg.add_menu_item(label="Optical Attn", callback=self._show_popup_window, check=True,
                                           user_data={'msg': "Enter the optical attenuation in dB:"})
                         dpg.add_menu_item(label="Comments", callback=self._show_popup_window,
                                           user_data={'msg': "Add comments below:"})
+                with dpg.menu(label="View"):
+                    dpg.add_menu_item(label="Trends", callback=lambda: dpg.show_item("trends_window"))
+                with dpg.menu(label="Tools"):
+                    dpg.add_menu_item(label="Probe I2C Clock", callback=self._probe_frequency)
 
             with dpg.group(label="overall", horizontal=True):
                 with dpg.group(label="left_side"):
@@ -482,9 +710,11 @@ class UserInterface:
                             t12 = dpg.add_text("Serial Number", color=(37, 37, 37))
                             self._frx_sn_id = dpg.add_text("0x0000", tag="frx_sn", color=(69,69,69))
                             dpg.add_spacer()
-            with dpg.child_window(tag="console_window", width=810, height=110) as win1:
-                dpg.add_text("Welcome to the console.")
-                dpg.add_text("Connect to the RF over Fiber boards to begin.")
+            with dpg.group(horizontal=True):
+                with dpg.child_window(tag="console_window", width=520, height=110) as win1:
+                    dpg.add_text("", tag="console_text")
+                with dpg.child_window(tag="bus_stats_window", width=282, height=110) as win2:
+                    dpg.add_text("", tag="bus_stats_text")
 
         dpg.bind_font(default_font)
         dpg.bind_item_font(h1, second_font)
@@ -514,6 +744,8 @@ class UserInterface:
 
         dpg.bind_item_theme(win1, console_theme)
         dpg.bind_item_font(win1, console_font)
+        dpg.bind_item_theme(win2, console_theme)
+        dpg.bind_item_font(win2, console_font)
 
         dpg.bind_item_font(t1, bold_font)
         dpg.bind_item_font(t2, bold_font)
@@ -533,4 +765,37 @@ class UserInterface:
         dpg.bind_item_font(t11, bold_font)
         dpg.bind_item_font(t12, bold_font)
 
+        self._make_trends_window()
+
+        self._monitor_widgets = {
+            FTX: {"lna_current": self._lna_current_id, "lna_voltage": self._lna_voltage_id,
+                  "ld_current": self._laser_current_id, "pd_current": self._laserpd_mon_id,
+                  "rf_power": self._ftx_rfmon_id, "atten": self._ftx_attn_id, "temp": self._ftx_temp_id,
+                  "vdda": self._ftx_vdda_id, "vdd": self._ftx_vdd_id, "uid": self._ftx_sn_id},
+            FRX: {"rf_power": self._frx_rfmon_id, "pd_current": self._pd_current_id, "temp": self._temp_id,
+                  "atten": self._frx_attn_id, "uid": self._frx_sn_id},
+        }
+
+        with dpg.handler_registry():
+            dpg.add_mouse_move_handler(callback=self._on_input)
+            dpg.add_mouse_click_handler(callback=self._on_input)
+            dpg.add_mouse_wheel_handler(callback=self._on_input)
+            dpg.add_key_press_handler(callback=self._on_input)
+
+        add_text_to_console("Welcome to the console.")
+        add_text_to_console("Connect to the RF over Fiber boards to begin.")
+
         # dpg.show_style_editor()
+
+    def _make_trends_window(self) -> None:
+        """Create the trends window, one line plot per monitor channel of each board."""
+        with dpg.window(label="Trends", tag="trends_window", show=False, width=600, height=560, pos=[120, 30]):
+            dpg.add_combo(list(TREND_SPANS), tag="trend_span", default_value="10 min", width=100)
+            with dpg.tab_bar():
+                for kind in (FTX, FRX):
+                    with dpg.tab(label=kind.upper()):
+                        for name in GETTERS[kind]:
+                            with dpg.plot(label=name + " (" + TREND_UNITS[name] + ")", height=150, width=-1):
+                                dpg.add_plot_axis(dpg.mvXAxis, label="seconds", tag="trend_x_" + kind + "_" + name)
+                                with dpg.plot_axis(dpg.mvYAxis, tag="trend_y_" + kind + "_" + name):
+                                    dpg.add_line_series([], [], tag="trend_" + kind + "_" + name)
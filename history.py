@@ -0,0 +1,112 @@
+"""In-memory monitor history with multi-resolution min/max decimation.
+
+Each level is a fixed size ring. Level 0 holds raw samples, and every `factor`
+samples of a level are folded into one min/max bin of the next level, so memory
+is fixed and a query for any window, from a minute to days, is answered from the
+finest level that covers it with a constant number of points.
+"""
+import threading
+import time
+
+import numpy as np
+
+from monitors import to_engineering
+
+
+class History:
+    """Min/max decimated history of one signal."""
+
+    def __init__(self, capacity=2048, factor=4, levels=8):
+        self.capacity = capacity
+        self.factor = factor
+        self._t = np.zeros((levels, capacity))
+        self._lo = np.zeros((levels, capacity), dtype=np.float32)
+        self._hi = np.zeros((levels, capacity), dtype=np.float32)
+        self._count = [0] * levels  # bins ever written to each level
+        self._pending = [None] * levels  # [t, lo, hi, n] of the bin being built for each level
+        self._lock = threading.Lock()
+
+    def add(self, value, timestamp=None) -> None:
+        t = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._push(0, t, value, value)
+
+    def _push(self, level, t, lo, hi) -> None:
+        i = self._count[level] % self.capacity
+        self._t[level, i] = t
+        self._lo[level, i] = lo
+        self._hi[level, i] = hi
+        self._count[level] += 1
+        if level + 1 == len(self._count):
+            return
+        pending = self._pending[level + 1]
+        if pending is None:
+            self._pending[level + 1] = [t, lo, hi, 1]
+            return
+        pending[1] = min(pending[1], lo)
+        pending[2] = max(pending[2], hi)
+        pending[3] += 1
+        if pending[3] == self.factor:
+            self._pending[level + 1] = None
+            self._push(level + 1, pending[0], pending[1], pending[2])
+
+    def _level(self, level):
+        n = min(self._count[level], self.capacity)
+        idx = np.arange(self._count[level] - n, self._count[level]) % self.capacity
+        return self._t[level, idx], self._lo[level, idx], self._hi[level, idx]
+
+    def query(self, window, points=500, now=None) -> tuple:
+        """Min/max envelope of the last `window` seconds as (times, values) for a line plot.
+
+        At most `points` bins are returned, each as its min and its max, so the
+        returned arrays have at most 2 * points entries.
+        """
+        now = time.time() if now is None else now
+        start = now - window
+        with self._lock:
+            for level in range(len(self._count)):
+                t, lo, hi = self._level(level)
+                covered = len(t) and (t[0] <= start or self._count[level] <= self.capacity)
+                if covered or level == len(self._count) - 1:
+                    break
+            keep = t >= start
+            t, lo, hi = t[keep], lo[keep], hi[keep]
+        if len(t) > points:
+            # Fold down to the requested number of points
+            group = -(-len(t) // points)
+            pad = -len(t) % group
+            t = t[::group]
+            lo = np.pad(lo, (0, pad), mode="edge").reshape(-1, group).min(axis=1)
+            hi = np.pad(hi, (0, pad), mode="edge").reshape(-1, group).max(axis=1)
+        times = np.repeat(t, 2)
+        values = np.empty(2 * len(t), dtype=np.float32)
+        values[0::2] = lo
+        values[1::2] = hi
+        return times, values
+
+
+class TrendHistory:
+    """History of every monitor channel of every board, fed by the acquisition workers.
+
+    Add it to AcquisitionWorker.listeners, it is called with the raw readings.
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.signals = {}  # (board kind, monitor name) -> History
+        self._lock = threading.Lock()
+
+    def __call__(self, kind, values) -> None:
+        t = time.time()
+        for name, value in to_engineering(kind, values).items():
+            if not isinstance(value, (int, float)):
+                continue
+            history = self.get(kind, name)
+            history.add(value, t)
+
+    def get(self, kind, name) -> History:
+        with self._lock:
+            history = self.signals.get((kind, name))
+            if history is None:
+                history = self.signals[(kind, name)] = History(**self.kwargs)
+            return history
@@ -0,0 +1,60 @@
+"""Background watcher for USB adapters being plugged in and unplugged.
+
+pyusb has no portable hot-plug callbacks, so the watcher enumerates the
+0x0403:0x6048 devices every `interval` seconds. Enumeration only reads the
+cached device list, not the devices themselves, so it is cheap enough to run
+a few times a second. A device is identified by its (bus, address), which
+changes every time it is plugged in again.
+"""
+import threading
+
+import usb.core
+
+from acquisition import Board
+
+
+def usb_address(dev):
+    """(bus, address) of a USB device, None for devices that aren't on USB (simulated adapters)."""
+    bus, address = getattr(dev, "bus", None), getattr(dev, "address", None)
+    return None if bus is None else (bus, address)
+
+
+class UsbWatcher(threading.Thread):
+    """Calls callback(added, removed) from a background thread when adapters come and go.
+
+    added maps the (bus, address) of each new device to its usb.core.Device,
+    removed is the set of (bus, address) of the devices that went away.
+    """
+
+    def __init__(self, callback, interval=0.2):
+        super().__init__(name="usb-watcher", daemon=True)
+        self.callback = callback
+        self.interval = interval
+        self.devices = {}
+        self._stop_event = threading.Event()
+
+    def scan(self) -> tuple:
+        """Enumerate the adapters once, returns (added, removed) since the last scan."""
+        found = usb.core.find(find_all=True, idVendor=Board.VID, idProduct=Board.PID)
+        current = {usb_address(dev): dev for dev in found}
+        added = {key: dev for key, dev in current.items() if key not in self.devices}
+        removed = set(self.devices) - set(current)
+        self.devices = current
+        return added, removed
+
+    def run(self) -> None:
+        # The adapters present at start aren't reported, unless this first scan fails
+        try:
+            self.scan()
+        except (usb.core.USBError, usb.core.NoBackendError):
+            pass
+        while not self._stop_event.wait(self.interval):
+            try:
+                added, removed = self.scan()
+            except (usb.core.USBError, usb.core.NoBackendError):
+                continue
+            if added or removed:
+                self.callback(added, removed)
+
+    def stop(self) -> None:
+        self._stop_event.set()
@@ -0,0 +1,268 @@
+"""Record and replay of the raw I2C traffic of a board.
+
+TracingController wraps an I2cController and logs every read, write, exchange
+and poll, with its time, device address, bytes written, bytes read and outcome,
+to a compact binary trace. Records are packed into a preallocated buffer and a
+background thread writes them out, so tracing costs the bus path one struct pack.
+
+ReplayController plays a trace back in place of the adapter, so the board
+drivers and the monitor path run against a captured session:
+
+    board = replay_board("ftx_trace.i2ct")
+    board.connect()
+    board.read_monitors()
+
+In strict mode every transaction must match the trace, in order, and recorded
+errors are raised again. Otherwise each transaction is answered with the next
+successful recorded response to the same request, cycling through them, so a
+trace can drive any number of monitor reads.
+
+File layout: HEADER, then one RECORD per transaction followed by the bytes
+written and the bytes read.
+"""
+from collections import namedtuple
+import struct
+import threading
+import time
+
+from pyftdi.i2c import I2cIOError, I2cNackError, I2cPort, I2cTimeoutError
+
+MAGIC = b"I2CT"
+VERSION = 1
+# magic, version, Unix time of the start of the trace, board kind
+HEADER = struct.Struct("<4sBd8s")
+# seconds since the start of the trace, operation, status, address, bytes written, bytes read
+RECORD = struct.Struct("<dBBBHH")
+
+OP_WRITE = 0
+OP_READ = 1
+OP_EXCHANGE = 2
+OP_POLL = 3
+OP_NAMES = ("write", "read", "exchange", "poll")
+
+STATUS_OK = 0
+STATUS_NACK = 1
+STATUS_TIMEOUT = 2
+STATUS_ERROR = 3
+ERRORS = {STATUS_NACK: I2cNackError, STATUS_TIMEOUT: I2cTimeoutError, STATUS_ERROR: I2cIOError}
+
+TraceRecord = namedtuple("TraceRecord", ["time", "op", "status", "address", "out", "data"])
+
+
+def _status(error) -> int:
+    if isinstance(error, I2cNackError):
+        return STATUS_NACK
+    if isinstance(error, TimeoutError):
+        return STATUS_TIMEOUT
+    return STATUS_ERROR
+
+
+class TraceWriter:
+    """Packs transaction records into a preallocated buffer flushed to a file by a background thread.
+
+    Two buffers of `capacity` bytes are swapped at every flush. If the writer falls
+    behind and the buffer fills up, records are dropped and counted in `dropped`.
+    """
+
+    def __init__(self, file_path, kind, capacity=1 << 20, flush_interval=0.5):
+        self.file_path = file_path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.records = 0
+        self._buffer = bytearray(capacity)
+        self._spare = bytearray(capacity)
+        self._length = 0
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = False
+        self._closed = False
+        with open(file_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, time.time(), kind.encode()))
+        self._writer = threading.Thread(target=self._run, name="i2c-trace-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, t, op, status, address, out, data) -> None:
+        size = RECORD.size + len(out) + len(data)
+        with self._lock:
+            if self._closed or self._length + size > self.capacity:
+                self.dropped += not self._closed
+                self._wake.set()
+                return
+            i = self._length
+            RECORD.pack_into(self._buffer, i, t - self._start, op, status, address, len(out), len(data))
+            i += RECORD.size
+            self._buffer[i:i + len(out)] = out
+            i += len(out)
+            self._buffer[i:i + len(data)] = data
+            self._length = i + len(data)
+            self.records += 1
+            if self._length > self.capacity // 2:
+                self._wake.set()
+
+    def flush(self) -> None:
+        """Write out everything recorded so far."""
+        with self._file_lock:
+            with self._lock:
+                chunk, length = self._buffer, self._length
+                self._buffer, self._spare, self._length = self._spare, chunk, 0
+            if length:
+                with open(self.file_path, "ab") as f:
+                    f.write(memoryview(chunk)[:length])
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        self._closing = True
+        self._wake.set()
+        self._writer.join()
+
+    def _run(self) -> None:
+        while not self._closing:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+
+class TracingController:
+    """Wraps an I2cController and records every transaction in a TraceWriter."""
+
+    def __init__(self, controller, writer):
+        self._controller = controller
+        self.writer = writer
+
+    def get_port(self, address) -> I2cPort:
+        return I2cPort(self, address)
+
+    def _call(self, op, address, out, func, *args, **kwargs):
+        t = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except OSError as e:
+            self.writer.record(t, op, _status(e), address, out, b"")
+            raise
+        if op == OP_POLL:
+            data = bytes([bool(result)])
+        else:
+            data = result or b""
+        self.writer.record(t, op, STATUS_OK, address, out, data)
+        return result
+
+    def read(self, address, readlen=1, relax=True) -> bytes:
+        return self._call(OP_READ, address, b"", self._controller.read, address, readlen, relax=relax)
+
+    def write(self, address, out, relax=True) -> None:
+        out = bytes(out)
+        return self._call(OP_WRITE, address, out, self._controller.write, address, out, relax=relax)
+
+    def exchange(self, address, out, readlen=0, relax=True) -> bytes:
+        out = bytes(out)
+        return self._call(OP_EXCHANGE, address, out, self._controller.exchange, address, out, readlen,
+                          relax=relax)
+
+    def poll(self, address, write=False, relax=True) -> bool:
+        return self._call(OP_POLL, address, b"", self._controller.poll, address, write, relax=relax)
+
+    def __getattr__(self, name):
+        return getattr(self._controller, name)
+
+
+def load(file_path) -> tuple:
+    """Read a trace back as (header dict, list of TraceRecord)."""
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    magic, version, start, kind = HEADER.unpack_from(raw, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(file_path + " is not an I2C trace")
+    header = {"start": start, "kind": kind.rstrip(b"\0").decode()}
+    records = []
+    i = HEADER.size
+    while i < len(raw):
+        t, op, status, address, nout, ndata = RECORD.unpack_from(raw, i)
+        i += RECORD.size
+        out = raw[i:i + nout]
+        i += nout
+        records.append(TraceRecord(t, op, status, address, out, raw[i:i + ndata]))
+        i += ndata
+    return header, records
+
+
+class ReplayError(Exception):
+    """A transaction the trace has no answer for."""
+
+
+class ReplayController:
+    """Stand in for an I2cController that answers from a recorded trace."""
+
+    def __init__(self, records, strict=True):
+        self.records = records
+        self.strict = strict
+        self.frequency = 100000.0
+        self.transactions = 0
+        self._next = 0
+        self._responses = {}  # (op, address, out, readlen) -> [records, next index]
+        for record in records:
+            if record.status != STATUS_OK:
+                continue
+            key = (record.op, record.address, record.out, len(record.data) if record.op != OP_POLL else 0)
+            self._responses.setdefault(key, [[], 0])[0].append(record)
+
+    def configure(self, url, **kwargs) -> None:
+        self.frequency = float(kwargs.get("frequency", self.frequency))
+
+    def close(self, freeze=False) -> None:
+        pass
+
+    def terminate(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def get_port(self, address) -> I2cPort:
+        return I2cPort(self, address)
+
+    def _answer(self, op, address, out, readlen):
+        self.transactions += 1
+        if self.strict:
+            if self._next >= len(self.records):
+                raise ReplayError("end of trace")
+            record = self.records[self._next]
+            self._next += 1
+            if (record.op, record.address, record.out) != (op, address, out):
+                raise ReplayError("transaction {}: expected {} 0x{:02X} {}, got {} 0x{:02X} {}".format(
+                    self._next - 1, OP_NAMES[record.op], record.address, record.out.hex(),
+                    OP_NAMES[op], address, out.hex()))
+        else:
+            entry = self._responses.get((op, address, out, readlen))
+            if entry is None:
+                raise ReplayError("no {} of 0x{:02X} {} in the trace".format(OP_NAMES[op], address, out.hex()))
+            record = entry[0][entry[1]]
+            entry[1] = (entry[1] + 1) % len(entry[0])
+        if record.status != STATUS_OK:
+            raise ERRORS[record.status]("Replayed " + OP_NAMES[op] + " error")
+        return record.data
+
+    def read(self, address, readlen=1, relax=True) -> bytes:
+        return self._answer(OP_READ, address, b"", readlen)
+
+    def write(self, address, out, relax=True) -> None:
+        self._answer(OP_WRITE, address, bytes(out), 0)
+
+    def exchange(self, address, out, readlen=0, relax=True) -> bytes:
+        return self._answer(OP_EXCHANGE, address, bytes(out), readlen)
+
+    def poll(self, address, write=False, relax=True) -> bool:
+        return bool(self._answer(OP_POLL, address, b"", 0)[0])
+
+
+def replay_board(file_path, strict=False):
+    """A Board of the trace's kind that runs against the trace instead of an adapter."""
+    from acquisition import Board
+    header, records = load(file_path)
+    controller = ReplayController(records, strict)
+    # One controller for every connect, so a trace spanning reconnects replays in order
+    return Board(header["kind"], device=file_path, controller_factory=lambda: controller)
@@ -1,7 +1,15 @@
-from gui import UserInterface
+import sys
+import time
+
+START = time.perf_counter()
 
 
 def main() -> None:
+    if len(sys.argv) > 1:
+        # Headless mode, the GUI stack is never imported
+        import cli
+        sys.exit(cli.main(sys.argv[1:], start=START))
+    from gui import UserInterface
     gui = UserInterface()
 
 
@@ -0,0 +1,360 @@
+"""ADC monitors of the FTX and FRX boards and their conversion to engineering units.
+
+The rfof board drivers read every monitor with its own getter, one TLA2528
+conversion per call. Where a monitor sits and how its code is converted is the
+driver's business, so it is taken from the driver rather than restated here:
+layout() runs each getter against a stand in bus that records what the driver
+writes and answers its ADC read with known codes. That gives the ADC address,
+the channel the getter selects, and the value the driver's own math returns for
+every 12 bit code. A monitor whose getter doesn't read the ADC that way is left
+out of the burst reads and read through its getter instead.
+
+A Converter holds those values as tables, so converting a reading or a short
+array of codes is a table lookup. Long arrays (burst captures, history exports)
+of monitors the driver converts linearly are converted with one fused multiply
+and subtract instead, which is faster than a gather once the array is larger
+than the table. Corrections on top of the driver's values can be loaded per
+board kind or per board serial number with load_calibration().
+"""
+from collections import Counter, namedtuple
+import json
+import threading
+
+import numpy as np
+from pyftdi.i2c import I2cIOError, I2cPort
+from rfof import Ftx
+from rfof import Frx
+
+from tla2528 import CHANNEL_SEL, OP_WRITE, RESOLUTION
+
+FTX = "ftx"
+FRX = "frx"
+
+DRIVERS = {FTX: Ftx, FRX: Frx}
+
+# Driver getter of every monitor, in display order
+GETTERS = {
+    FTX: {
+        "temp": "get_temp",  # degC
+        "ld_current": "get_ld_current",  # mA
+        "pd_current": "get_pd_current",  # uA
+        "rf_power": "get_rf_power",  # dBm
+        "vdd": "get_vdd_voltage",  # V
+        "vdda": "get_vdda_voltage",  # V
+        "lna_current": "get_lna_current",  # mA
+        "lna_voltage": "get_lna_voltage",  # V
+    },
+    FRX: {
+        "rf_power": "get_rf_power",  # dBm
+        "pd_current": "get_pd_current",  # mA
+        "temp": "get_temp",  # degC
+    },
+}
+
+# What the ADC and the other devices the drivers talk to are
+# adc_address: I2C address of the TLA2528, None if no getter could be traced to it
+# channels: monitor name -> ADC channel, for the monitors read in bursts
+# tables: monitor name -> the driver's value for every 12 bit code
+# affine: monitor name -> (scale, shift) with value = code * scale - shift, None if the driver isn't linear
+# devices: label -> I2C address and first byte written (register pointer) of the device behind a driver call
+Layout = namedtuple("Layout", ["kind", "adc_address", "channels", "tables", "affine", "devices"])
+
+# Driver calls traced for the device labels, with their arguments
+DEVICE_CALLS = {"UUID": ("get_uid",), "ATTEN": ("get_atten",), "DIGIPOT": ("set_ld_current", 10.0)}
+
+# Codes the getters are run at to check whether the driver's math is linear
+_SAMPLE_CODES = tuple(range(0, RESOLUTION, 256)) + (RESOLUTION - 1,)
+
+
+class _TraceBus:
+    """Stand in for an I2cController that records the writes of a board driver
+    and answers every read with the two bytes of one ADC result."""
+
+    # Transactions allowed per driver call, in case a driver polls for something the stand in never gives
+    LIMIT = 64
+
+    def __init__(self):
+        self.code = 0
+        self.writes = []
+        self.addresses = []
+
+    def reset(self, code=0) -> None:
+        self.code = code
+        self.writes = []
+        self.addresses = []
+
+    def get_port(self, address) -> I2cPort:
+        return I2cPort(self, address)
+
+    def _transaction(self, address) -> None:
+        if len(self.addresses) >= self.LIMIT:
+            raise I2cIOError("Driver call did not finish")
+        self.addresses.append(address)
+
+    def _data(self, readlen) -> bytes:
+        return ((self.code << 4).to_bytes(2, "big") * readlen)[:readlen]
+
+    def read(self, address, readlen=1, relax=True) -> bytes:
+        self._transaction(address)
+        return self._data(readlen)
+
+    def write(self, address, out, relax=True) -> None:
+        self._transaction(address)
+        self.writes.append((address, bytes(out)))
+
+    def exchange(self, address, out, readlen=0, relax=True) -> bytes:
+        self.write(address, out)
+        return self._data(readlen)
+
+    def poll(self, address, write=False, relax=True) -> bool:
+        self._transaction(address)
+        return True
+
+    def flush(self) -> None:
+        pass
+
+
+def _trace_getter(driver, bus, getter, code) -> tuple:
+    """Run a getter with the ADC answering `code`: (value, set of (address, channel) it selected)."""
+    bus.reset(code)
+    value = float(getattr(driver, getter)())
+    selected = {(address, out[2]) for address, out in bus.writes
+                if len(out) == 3 and out[0] == OP_WRITE and out[1] == CHANNEL_SEL}
+    return value, selected
+
+
+def _trace_monitor(driver, bus, getter) -> tuple:
+    """(ADC address, channel, table, affine) of a monitor, None if the getter can't be traced."""
+    try:
+        samples = {}
+        selected = set()
+        for code in _SAMPLE_CODES:
+            samples[code], sel = _trace_getter(driver, bus, getter, code)
+            selected |= sel
+    except Exception:
+        return None
+    values = np.array(list(samples.values()))
+    if len(selected) != 1 or not np.all(np.isfinite(values)) or np.ptp(values) == 0:
+        return None
+    (address, channel), = selected
+    shift = -samples[0]
+    scale = (samples[RESOLUTION - 1] + shift) / (RESOLUTION - 1)
+    codes = np.array(list(samples))
+    if np.allclose(codes * scale - shift, values, rtol=1e-9, atol=1e-12):
+        return address, channel, np.arange(RESOLUTION) * scale - shift, (scale, shift)
+    # Not linear (rounded, clamped or a curve): ask the driver for every code
+    try:
+        table = np.array([_trace_getter(driver, bus, getter, code)[0] for code in range(RESOLUTION)])
+    except Exception:
+        return None
+    return address, channel, table, None
+
+
+def _trace_layout(kind) -> Layout:
+    bus = _TraceBus()
+    try:
+        driver = DRIVERS[kind](bus)
+    except Exception:
+        return Layout(kind, None, {}, {}, {}, {})
+    traced = {}
+    for name, getter in GETTERS[kind].items():
+        result = _trace_monitor(driver, bus, getter)
+        if result is not None:
+            traced[name] = result
+    adc_address = None
+    if traced:
+        adc_address = Counter(result[0] for result in traced.values()).most_common(1)[0][0]
+    traced = {name: result for name, result in traced.items() if result[0] == adc_address}
+    devices = {}
+    if adc_address is not None:
+        devices["ADC"] = (adc_address, None)
+    for label, (method, *args) in DEVICE_CALLS.items():
+        bus.reset()
+        try:
+            getattr(driver, method)(*args)
+        except Exception:
+            continue
+        if bus.addresses:
+            address = bus.addresses[0]
+            first = next((out for a, out in bus.writes if a == address and out), b"")
+            devices[label] = (address, first[0] if first else None)
+    return Layout(kind, adc_address,
+                  {name: result[1] for name, result in traced.items()},
+                  {name: result[2] for name, result in traced.items()},
+                  {name: result[3] for name, result in traced.items()},
+                  devices)
+
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def layout(kind) -> Layout:
+    """The Layout of a board kind, traced from its driver on first use."""
+    with _layouts_lock:
+        if kind not in _layouts:
+            _layouts[kind] = _trace_layout(kind)
+        return _layouts[kind]
+
+
+def device_name(address) -> str:
+    """Label of a device address on either board, for statistics and logs."""
+    for kind in DRIVERS:
+        for label, (device, _) in layout(kind).devices.items():
+            if device == address:
+                return label
+    return "0x{:02X}".format(address)
+
+
+def read_monitors(adc, kind, names) -> dict:
+    """Read the raw codes of the named monitors that have an ADC channel in one burst.
+
+    Monitors without a channel in the board's Layout are left out.
+    """
+    channels = layout(kind).channels
+    batched = [name for name in names if name in channels]
+    if adc is None or not batched:
+        return {}
+    codes = adc.read_channels([channels[name] for name in batched])
+    return dict(zip(batched, codes))
+
+
+def read_all_monitors(adc, kind) -> dict:
+    """Read the raw codes of every monitor of a board that has an ADC channel in one burst."""
+    return read_monitors(adc, kind, GETTERS[kind])
+
+
+class Converter:
+    """Lookup tables from raw codes to engineering units for the monitors of one board.
+
+    corrections maps monitor names to (gain, offset), applied to the driver's value
+    as gain * value + offset.
+    """
+
+    def __init__(self, layout, corrections=None):
+        self.kind = layout.kind
+        self.corrections = dict(corrections or {})
+        self.tables = {}
+        # value = code * scale - shift, for monitors the driver converts linearly
+        self.affine = {}
+        for name, table in layout.tables.items():
+            gain, offset = self.corrections.get(name, (1.0, 0.0))
+            self.tables[name] = table * gain + offset
+            if layout.affine[name] is not None:
+                scale, shift = layout.affine[name]
+                self.affine[name] = (scale * gain, shift * gain - offset)
+        # The same tables as lists, indexing them with a Python int is cheaper than a NumPy array
+        self._lists = {name: table.tolist() for name, table in self.tables.items()}
+        # Monitors read through their getter arrive in engineering units, only corrected
+        self._direct = {name: c for name, c in self.corrections.items() if name not in self.tables}
+
+    def convert(self, name, codes, full_scale=RESOLUTION):
+        """Convert a NumPy array of codes of one monitor.
+
+        Codes of another full scale than 12 bits (averaged results) are scaled to it.
+        """
+        codes = np.asarray(codes)
+        affine = self.affine.get(name)
+        if full_scale == RESOLUTION and (affine is None or codes.size <= RESOLUTION):
+            return np.take(self.tables[name], codes)
+        if affine is None:
+            return np.interp(codes * (RESOLUTION / full_scale), np.arange(RESOLUTION), self.tables[name])
+        scale, shift = affine
+        return codes * (scale * RESOLUTION / full_scale) - shift
+
+    def to_engineering(self, values) -> dict:
+        """Convert the raw codes in a monitor reading, passing other entries through."""
+        converted = dict(values)
+        for name, table in self._lists.items():
+            code = values.get(name)
+            if code is not None:
+                converted[name] = table[code]
+        for name, (gain, offset) in self._direct.items():
+            value = values.get(name)
+            if value is not None:
+                converted[name] = gain * value + offset
+        return converted
+
+
+# Converters by board kind, and by serial number for boards with their own calibration.
+# Replaced as a whole by load_calibration(), never changed in place but for adding a missing kind.
+_converters = {}
+
+
+def converter(kind, serial=None) -> Converter:
+    """The Converter for a board, its own calibration if one was loaded."""
+    converters = _converters
+    conv = converters.get(serial)
+    if conv is None or conv.kind != kind:
+        conv = converters.get(kind)
+        if conv is None:
+            conv = converters.setdefault(kind, Converter(layout(kind)))
+    return conv
+
+
+def _corrections(key, kind, entry, base) -> dict:
+    if not isinstance(entry, dict) or not isinstance(entry.get("monitors", {}), dict):
+        raise ValueError(key + ": expected an object with a \"monitors\" object")
+    if entry.get("kind", kind) != kind:
+        raise ValueError(key + ": \"kind\" must be " + kind)
+    corrections = dict(base)
+    for name, constants in entry.get("monitors", {}).items():
+        if name not in GETTERS[kind]:
+            raise ValueError(key + ": unknown monitor " + name)
+        if not isinstance(constants, dict) or set(constants) - {"gain", "offset"}:
+            raise ValueError(key + " " + name + ": expected an object with \"gain\" and/or \"offset\"")
+        gain, offset = corrections.get(name, (1.0, 0.0))
+        gain, offset = constants.get("gain", gain), constants.get("offset", offset)
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (gain, offset)):
+            raise ValueError(key + " " + name + ": gain and offset must be numbers")
+        corrections[name] = (float(gain), float(offset))
+    return corrections
+
+
+def load_calibration(file_path) -> None:
+    """Load calibration corrections from a JSON file, replacing any loaded before.
+
+    Each monitor's value from the driver becomes gain * value + offset. Entries
+    are keyed by board kind or by board serial number, serial entries build on
+    their kind's entry, and any constant not given keeps its default (gain 1,
+    offset 0):
+
+        {"ftx": {"monitors": {"vdd": {"gain": 1.004}}},
+         "0x1a2b3c4d": {"kind": "ftx", "monitors": {"ld_current": {"gain": 0.99},
+                                                    "temp": {"offset": -0.4}}}}
+
+    Raises ValueError naming the file and the entry if the file is malformed, in
+    which case the calibration in use is kept.
+    """
+    global _converters
+    with open(file_path) as f:
+        entries = json.load(f)
+    try:
+        converters = _converters_from(entries)
+    except ValueError as e:
+        raise ValueError(str(file_path) + ": " + str(e)) from None
+    _converters = converters
+
+
+def _converters_from(entries) -> dict:
+    if not isinstance(entries, dict):
+        raise ValueError("expected an object of entries by board kind or serial number")
+    corrections = {kind: _corrections(kind, kind, entries.get(kind, {}), {}) for kind in DRIVERS}
+    converters = {kind: Converter(layout(kind), corrections[kind]) for kind in DRIVERS}
+    for key, entry in entries.items():
+        if key not in DRIVERS:
+            kind = entry.get("kind") if isinstance(entry, dict) else None
+            if kind not in DRIVERS:
+                raise ValueError(key + ": \"kind\" must be one of " + ", ".join(DRIVERS))
+            converters[key] = Converter(layout(kind), _corrections(key, kind, entry, corrections[kind]))
+    return converters
+
+
+def to_engineering(kind, values) -> dict:
+    """Convert the raw codes in a monitor reading to engineering units.
+
+    The board's calibration is picked by the serial number in the reading, if it
+    has one. Entries that are not ADC codes (serial number, attenuation, monitors
+    read through their getter) are passed through.
+    """
+    return converter(kind, values.get("uid")).to_engineering(values)
@@ -0,0 +1,135 @@
+"""Configuration profiles: the setpoints of a board, saved per serial number.
+
+A profile file is JSON keyed by board serial number (as read by get_uid()), with
+optional per kind defaults for boards that have no entry of their own:
+
+    {
+        "0x1a2b3c4d": {"kind": "ftx", "atten": 10.0, "ld_current": 25.0, "lna_enable": true},
+        "frx": {"atten": 3.5}
+    }
+
+apply() only writes the setpoints that differ from the board's cached state,
+writes them back to back without waiting for each one to settle, then waits
+once and reads back everything it wrote in a single verification pass.
+"""
+import json
+import time
+
+from monitors import FTX, FRX
+from regcache import ATTENUATOR, DIGIPOT
+
+# Settings of each board kind, only the FTX has the laser and the LNA
+SETTINGS = {FTX: ("atten", "ld_current", "lna_enable"), FRX: ("atten",)}
+# Largest read back error accepted per setting
+TOLERANCE = {"atten": 0.125, "ld_current": 1.0}
+
+
+def _check(key, profile) -> None:
+    if not isinstance(profile, dict):
+        raise ValueError(key + ": expected an object of settings")
+    kind = profile.get("kind", key if key in SETTINGS else None)
+    if kind is not None and kind not in SETTINGS:
+        raise ValueError(key + ": unknown board kind " + str(kind))
+    allowed = SETTINGS[kind] if kind is not None else SETTINGS[FTX]
+    for name, value in profile.items():
+        if name == "kind":
+            continue
+        if name not in allowed:
+            raise ValueError(key + ": " + name + " is not a setting of the " + (kind or "board").upper())
+        if name == "lna_enable" and not isinstance(value, bool):
+            raise ValueError(key + ": lna_enable must be true or false")
+        if name != "lna_enable" and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(key + ": " + name + " must be a number")
+
+
+def load(file_path) -> dict:
+    """Read a profile table, raises ValueError for settings a board kind doesn't have."""
+    with open(file_path) as f:
+        profiles = json.load(f)
+    if not isinstance(profiles, dict):
+        raise ValueError("expected an object of profiles by serial number or board kind")
+    for key, profile in profiles.items():
+        _check(key, profile)
+    return profiles
+
+
+def save(file_path, profiles) -> None:
+    with open(file_path, "w") as f:
+        json.dump(profiles, f, indent=2, sort_keys=True)
+
+
+def snapshot(board) -> dict:
+    """Profile of the commanded state of a connected board, from its cache only.
+
+    Setpoints that haven't been read or written since connecting are left out.
+    """
+    profile = {"kind": board.kind}
+    if board.kind == FTX:
+        profile["lna_enable"] = board.lna_enabled
+    atten = board.cache.peek(ATTENUATOR)
+    if atten is not None:
+        profile["atten"] = atten
+    if board.ld_setpoint is not None:
+        profile["ld_current"] = board.ld_setpoint
+    return profile
+
+
+def find(profiles, board):
+    """The profile for a board, by serial number and then by kind, or None."""
+    profile = profiles.get(board.get_uid()) or profiles.get(board.kind)
+    if profile is None or profile.get("kind", board.kind) != board.kind:
+        return None
+    return profile
+
+
+def changes(board, profile) -> dict:
+    """The settings of a profile that differ from the board's cached state.
+
+    Settings the board's kind doesn't have are left out.
+    """
+    current = {"atten": board.cache.peek(ATTENUATOR), "ld_current": board.ld_setpoint,
+               "lna_enable": board.lna_enabled}
+    return {name: profile[name] for name in SETTINGS[board.kind]
+            if name in profile and profile[name] != current[name]}
+
+
+def apply(board, profile, wait=0.1) -> dict:
+    """Write the settings of a profile that changed, then verify them.
+
+    Returns a dict with the settings "written", the values read back and the
+    settings whose read back value is out of tolerance as "mismatch".
+    """
+    pending = changes(board, profile)
+    for name, value in pending.items():
+        if name == "atten":
+            board.cache.invalidate(ATTENUATOR)
+            board.driver.set_atten(value)
+        elif name == "ld_current":
+            board.driver.set_ld_current(value)
+            board.cache.put(DIGIPOT, value)
+        elif name == "lna_enable":
+            board.driver.set_lna_enable(value)
+            board.lna_enabled = value = bool(value)
+        # Commanded from now on, so a reconnect restores these and not what was set before
+        board.setpoints[name] = value
+    if pending:
+        time.sleep(wait)
+    readback = {}
+    if "atten" in pending:
+        readback["atten"] = board.get_atten()
+    if "ld_current" in pending:
+        readback["ld_current"] = board.driver.get_ld_current()
+    if pending.get("lna_enable"):
+        readback["lna_current"] = board.driver.get_lna_current()
+        readback["lna_voltage"] = board.driver.get_lna_voltage()
+    mismatch = {name: readback[name] for name in TOLERANCE
+                if name in readback and abs(readback[name] - pending[name]) > TOLERANCE[name]}
+    return {"written": sorted(pending), "readback": readback, "mismatch": mismatch}
+
+
+def apply_matching(board, profiles, wait=0.1):
+    """Apply the profile for the board from a profile table, None if it has none."""
+    profile = find(profiles, board)
+    if profile is None:
+        return None
+    return apply(board, profile, wait)
@@ -0,0 +1,91 @@
+"""Streaming telemetry recorder for long soak runs.
+
+Every polled sample goes into a preallocated NumPy ring buffer, and a background
+thread appends the new records to a binary file in chunks. Memory use is fixed by
+the ring capacity and the poll path never waits on disk I/O. Read a recording
+back with load().
+"""
+import threading
+import time
+
+import numpy as np
+
+from monitors import FTX, FRX, to_engineering
+
+CHANNELS = ("lna_current", "lna_voltage", "ld_current", "pd_current", "rf_power", "atten", "temp", "vdd", "vdda")
+BOARDS = (FTX, FRX)
+
+# One record per polled sample, channels a board doesn't have are NaN
+DTYPE = np.dtype([("time", "<f8"), ("board", "u1")] + [(name, "<f4") for name in CHANNELS])
+
+
+def load(file_path) -> np.ndarray:
+    """Read a recording back as a structured array, board is an index into BOARDS."""
+    return np.fromfile(file_path, dtype=DTYPE)
+
+
+class Recorder:
+    """Ring buffer of telemetry samples flushed to an append-only file.
+
+    If the writer falls more than `capacity` samples behind, the oldest unwritten
+    samples are overwritten and counted in `dropped`.
+    """
+
+    def __init__(self, file_path, capacity=65536, flush_interval=5.0):
+        self.file_path = file_path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._ring = np.zeros(capacity, dtype=DTYPE)
+        self._written = 0  # total samples recorded
+        self._flushed = 0  # total samples written to the file
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = False
+        self._writer = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, kind, values, timestamp=None) -> None:
+        """Add one monitor reading (raw codes, as posted by the acquisition worker)."""
+        values = to_engineering(kind, values)
+        row = (time.time() if timestamp is None else timestamp, BOARDS.index(kind)) + \
+            tuple(values.get(name, np.nan) for name in CHANNELS)
+        with self._lock:
+            self._ring[self._written % self.capacity] = row
+            self._written += 1
+            if self._written - self._flushed > self.capacity:
+                self.dropped += self._written - self._flushed - self.capacity
+                self._flushed = self._written - self.capacity
+
+    def __call__(self, kind, values) -> None:
+        self.record(kind, values)
+
+    def latest(self, n) -> np.ndarray:
+        """Copy of the last n samples still in the ring, oldest first."""
+        with self._lock:
+            n = min(n, self._written, self.capacity)
+            idx = np.arange(self._written - n, self._written) % self.capacity
+            return self._ring[idx]
+
+    def flush(self) -> None:
+        """Append every sample not yet written to the file."""
+        with self._file_lock:
+            with self._lock:
+                idx = np.arange(self._flushed, self._written) % self.capacity
+                chunk = self._ring[idx]
+                self._flushed = self._written
+            if len(chunk):
+                with open(self.file_path, "ab") as f:
+                    chunk.tofile(f)
+
+    def close(self) -> None:
+        self._closing = True
+        self._wake.set()
+        self._writer.join()
+
+    def _run(self) -> None:
+        while not self._closing:
+            self._wake.wait(self.flush_interval)
+            self.flush()
+        self.flush()
@@ -0,0 +1,50 @@
+"""Write-through cache for static and commanded device state.
+
+Values are keyed by the setting they hold. The serial number never changes and
+the attenuator expander and laser digipot only change when we write them, so
+they are served from memory and only the analog monitors go to the bus.
+"""
+import threading
+
+# Cached registers
+UID = "uid"  # UUID EEPROM serial number
+ATTENUATOR = "atten"  # TCA6408A output port
+DIGIPOT = "ld_current"  # CAT5171 wiper
+
+
+class RegisterCache:
+    """Values read from or written to the board, invalidated on write and on reconnect."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """Cached value for key, calling loader() to read it from the board on a miss."""
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def peek(self, key, default=None):
+        """Cached value for key without touching the bus."""
+        with self._lock:
+            return self._values.get(key, default)
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
@@ -0,0 +1,85 @@
+"""Deadline based polling schedule with a period and priority per signal.
+
+Each signal is read when its deadline passes. Signals with a max_period back off,
+doubling their period up to max_period while the value stays within tolerance,
+and drop back to their base period as soon as it moves. Signals due shortly
+after a read are pulled forward into it, so they share the same ADC burst.
+"""
+from collections import namedtuple
+import heapq
+
+from monitors import FTX, FRX
+
+# period and max_period in seconds, lower priority values are read first,
+# tolerance is in raw ADC codes
+Signal = namedtuple("Signal", ["name", "period", "priority", "max_period", "tolerance"])
+
+SIGNALS = {
+    FTX: (
+        Signal("lna_fault", 0.25, 0, 0.25, 0),
+        Signal("rf_power", 0.5, 1, 0.5, 0),
+        Signal("lna_current", 0.5, 1, 0.5, 0),
+        Signal("lna_voltage", 1.0, 2, 4.0, 4),
+        Signal("pd_current", 1.0, 2, 4.0, 4),
+        Signal("ld_current", 1.0, 2, 4.0, 4),
+        Signal("temp", 5.0, 3, 30.0, 4),
+        Signal("vdd", 5.0, 3, 30.0, 4),
+        Signal("vdda", 5.0, 3, 30.0, 4),
+    ),
+    FRX: (
+        Signal("rf_power", 0.5, 1, 0.5, 0),
+        Signal("pd_current", 1.0, 2, 4.0, 4),
+        Signal("temp", 5.0, 3, 30.0, 4),
+    ),
+}
+
+
+class Schedule:
+    """Next read time of every signal of a board.
+
+    lookahead is the fraction of its period a signal may be read early to join a read.
+    """
+
+    def __init__(self, signals, lookahead=0.25):
+        self.signals = {s.name: s for s in signals}
+        self.lookahead = lookahead
+        self.periods = {s.name: s.period for s in signals}
+        self._last = {}
+        self._heap = []
+
+    def reset(self, now) -> None:
+        """Make every signal due now, at its base period."""
+        self.periods = {name: s.period for name, s in self.signals.items()}
+        self._last = {}
+        self._heap = [(now, self.signals[name].priority, name) for name in self.signals]
+        heapq.heapify(self._heap)
+
+    def next_deadline(self):
+        """Time the next signal is due, None if nothing is scheduled."""
+        return self._heap[0][0] if self._heap else None
+
+    def due(self, now) -> list:
+        """Remove and return the signals due now, in priority order.
+
+        Signals due within lookahead of their period are included too.
+        """
+        names = []
+        while self._heap:
+            deadline, priority, name = self._heap[0]
+            if deadline > now + self.lookahead * self.periods[name]:
+                break
+            heapq.heappop(self._heap)
+            names.append((priority, name))
+        return [name for _, name in sorted(names)]
+
+    def update(self, name, value, now) -> None:
+        """Record a value read for a signal and schedule its next read."""
+        signal = self.signals[name]
+        last = self._last.get(name)
+        if value is not None:
+            self._last[name] = value
+            if last is not None and abs(value - last) <= signal.tolerance:
+                self.periods[name] = min(self.periods[name] * 2, signal.max_period)
+            else:
+                self.periods[name] = signal.period
+        heapq.heappush(self._heap, (now + self.periods[name], signal.priority, name))
@@ -0,0 +1,248 @@
+"""Local control and telemetry server sharing one USB connection between many clients.
+
+The server owns the acquisition workers of the FTX and FRX boards and speaks
+newline delimited JSON over a local TCP or Unix socket:
+
+    {"id": 1, "cmd": "get", "board": "ftx"}
+    {"id": 2, "cmd": "set", "board": "frx", "setting": "atten", "value": 10.5}
+    {"id": 3, "cmd": "subscribe", "boards": ["ftx", "frx"]}
+    {"id": 4, "cmd": "connect", "board": "ftx"}
+
+Every request gets a reply with the same id, {"id": .., "ok": true, "result": ..}
+or {"id": .., "ok": false, "error": ".."}. Subscribers are pushed
+{"event": "monitor", "board": .., "values": {..}} from the one shared poll loop,
+so clients never generate I2C traffic of their own, and {"event": "alarm", ..}
+when a limit alarm is raised or cleared. A subscriber that falls more than
+MAX_BUFFER bytes behind is disconnected.
+"""
+import argparse
+import asyncio
+import json
+import math
+
+import profiles
+from acquisition import AcquisitionWorker, Board, FTX, FRX, EVENT_LOG, EVENT_CONNECTED, EVENT_DISCONNECTED, \
+    EVENT_MONITOR, EVENT_ALARM
+from adapter import Adapter
+from alarms import AlarmEngine, describe
+from monitors import to_engineering
+
+SETTINGS = {"atten": "set_atten", "ld_current": "set_ld_current", "lna_enable": "set_lna_enable"}
+# Pushed bytes a subscriber may leave unread before it is dropped
+MAX_BUFFER = 1 << 20
+
+
+class _LoopQueue:
+    """Events queue for the workers that hands each event over to the asyncio loop."""
+
+    def __init__(self, loop, handler):
+        self._loop = loop
+        self._handler = handler
+
+    def put(self, item) -> None:
+        self._loop.call_soon_threadsafe(self._handler, item)
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (bool, int, str)) or value is None:
+        return value
+    value = float(value)
+    # JSON has no NaN or infinity, a re-armed alarm carries NaN
+    return value if math.isfinite(value) else None
+
+
+def setting_value(setting, value):
+    """A client's value for a setting, raises ValueError if it isn't one the board takes."""
+    if setting == "lna_enable":
+        if not isinstance(value, bool):
+            raise ValueError("lna_enable must be true or false")
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(setting + " must be a number")
+    return float(value)
+
+
+class Server:
+    """Owns the board connections and serves any number of clients."""
+
+    def __init__(self, boards=None):
+        self.adapter = Adapter()
+        self.boards = boards or self.adapter.boards()
+        self.latest = {kind: {} for kind in self.boards}
+        self.connected = {kind: False for kind in self.boards}
+        self.subscribers = {}  # StreamWriter -> set of board kinds
+        self.workers = {}
+        self.alarms = AlarmEngine()
+        self._loop = None
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None, connect=True):
+        self._loop = asyncio.get_running_loop()
+        events = _LoopQueue(self._loop, self._on_event)
+        for kind, board in self.boards.items():
+            worker = AcquisitionWorker(board, events, alarms=self.alarms)
+            worker.start()
+            self.workers[kind] = worker
+            if connect:
+                worker.submit("connect")
+        if unix_path:
+            return await asyncio.start_unix_server(self._client, path=unix_path)
+        return await asyncio.start_server(self._client, host, port)
+
+    def stop(self) -> None:
+        for worker in self.workers.values():
+            worker.stop()
+        for worker in self.workers.values():
+            worker.join(timeout=2)
+
+    def usb_changed(self, added, removed) -> None:
+        """USB watcher callback, lets the workers reconnect or drop their boards at once."""
+        if removed:
+            self.adapter.forget()
+        for worker in self.workers.values():
+            worker.submit("usb_changed", added, removed)
+
+    def _on_event(self, item) -> None:
+        event, kind, payload = item
+        if event == EVENT_MONITOR:
+            values = _jsonable(to_engineering(kind, payload))
+            self.latest[kind].update(values)
+            self._push({"event": "monitor", "board": kind, "values": values}, kind)
+        elif event in (EVENT_CONNECTED, EVENT_DISCONNECTED):
+            self.connected[kind] = event == EVENT_CONNECTED
+            if not self.connected[kind]:
+                self.latest[kind] = {}
+            self._push({"event": event, "board": kind}, kind)
+        elif event == EVENT_LOG:
+            self._push({"event": "log", "board": kind, "message": payload}, kind)
+        elif event == EVENT_ALARM:
+            self._push({"event": "alarm", "board": kind, "name": payload.rule.name, "active": payload.active,
+                        "value": _jsonable(payload.value), "message": describe(payload)}, kind)
+
+    def _push(self, message, kind) -> None:
+        line = (json.dumps(message) + "\n").encode()
+        for writer, kinds in list(self.subscribers.items()):
+            if kind not in kinds or writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_BUFFER:
+                # A client that stopped reading would otherwise grow the buffer without limit
+                self.subscribers.pop(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    def _run(self, kind, command, *args):
+        """Run a command on a board's worker and await its reply."""
+        future = self._loop.create_future()
+
+        def reply(result, error):
+            self._loop.call_soon_threadsafe(_resolve, result, error)
+
+        def _resolve(result, error):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        self.workers[kind].submit(command, *args, reply=reply)
+        return future
+
+    async def handle(self, request, writer=None):
+        """Result of one request, raises on errors."""
+        if not isinstance(request, dict):
+            raise ValueError("requests must be JSON objects")
+        cmd = request.get("cmd")
+        kind = request.get("board")
+        if kind is not None and kind not in self.boards:
+            raise ValueError("unknown board " + str(kind))
+        if kind is None and cmd in ("set", "connect", "disconnect"):
+            raise ValueError(cmd + " needs a board")
+        if cmd == "get":
+            kinds = [kind] if kind else list(self.boards)
+            return {k: dict(self.latest[k], connected=self.connected[k]) for k in kinds}
+        if cmd == "set":
+            name = request.get("setting")
+            if name not in profiles.SETTINGS[kind]:
+                raise ValueError("unknown setting " + str(name) + " for the " + kind.upper() + " board")
+            value = setting_value(name, request.get("value"))
+            return _jsonable(await self._run(kind, SETTINGS[name], value))
+        if cmd in ("connect", "disconnect"):
+            return await self._run(kind, cmd)
+        if cmd == "subscribe":
+            boards = request.get("boards")
+            if boards is None:
+                boards = list(self.boards)
+            if not isinstance(boards, list) or not boards or not all(isinstance(b, str) and b in self.boards for b in boards):
+                raise ValueError("boards must be a list of " + ", ".join(sorted(self.boards)))
+            self.subscribers[writer] = set(boards)
+            return sorted(self.subscribers[writer])
+        if cmd == "unsubscribe":
+            self.subscribers.pop(writer, None)
+            return True
+        raise ValueError("unknown command " + str(cmd))
+
+    async def _client(self, reader, writer) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    result = await self.handle(request, writer)
+                    reply = {"id": request.get("id"), "ok": True, "result": result}
+                except Exception as e:
+                    # Bad requests and failed commands are answered, the connection stays up
+                    reply = {"id": request.get("id") if isinstance(request, dict) else None,
+                             "ok": False, "error": str(e)}
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, unix_path=None, simulate=False) -> None:
+    boards = None
+    if simulate:
+        from simbus import SimulatedAdapter
+        adapter = SimulatedAdapter()
+        boards = {kind: Board(kind, device=adapter, controller_factory=adapter.controller) for kind in (FTX, FRX)}
+    server = Server(boards)
+    listener = await server.start(host, port, unix_path)
+    watcher = None
+    if not simulate:
+        from hotplug import UsbWatcher
+        watcher = UsbWatcher(server.usb_changed)
+        watcher.start()
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        server.stop()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the FTX/FRX boards to local clients.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--simulate", action="store_true", help="use the simulated I2C bus")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.simulate))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""Simulated I2C backend for running without an FTDI adapter.
+
+SimulatedI2cController is a drop in replacement for pyftdi's I2cController. It
+hands out real pyftdi I2cPort objects, and emulates the register maps of the
+chips on the FTX and FRX boards (TLA2528 ADC, TCA6408A expander, CAT5171 digipot
+and the UUID EEPROM), with configurable latency per transaction and injected
+timeouts and NACKs. The chips sit at the addresses the board drivers use and the
+monitors on the ADC channels they read, see monitors.layout().
+
+    adapter = SimulatedAdapter()
+    board = Board(FTX, device=adapter, controller_factory=adapter.controller)
+"""
+import random
+import threading
+import time
+
+from pyftdi.i2c import I2cIOError, I2cNackError, I2cPort, I2cTimeoutError
+
+import numpy as np
+
+from monitors import FTX, FRX, layout
+import tla2528
+
+
+class SimTLA2528:
+    """TLA2528 register map, manual and auto-sequence conversions.
+
+    inputs maps channel number to the 12 bit code the channel converts to.
+    """
+
+    def __init__(self, inputs=None, noise=0, rng=None):
+        self.registers = bytearray(0x20)
+        self.inputs = dict(inputs or {})
+        self.noise = noise
+        self.rng = rng or random.Random(0)
+        self._pointer = None
+        self._sequence = []
+
+    def convert(self, channel) -> int:
+        code = self.inputs.get(channel, 0)
+        if self.noise:
+            code += self.rng.randint(-self.noise, self.noise)
+        return max(0, min(tla2528.RESOLUTION - 1, code))
+
+    def write(self, data) -> None:
+        opcode, register = data[0], data[1]
+        if opcode == tla2528.OP_READ:
+            self._pointer = register
+            return
+        self._pointer = None
+        if opcode == tla2528.OP_WRITE:
+            self.registers[register] = data[2]
+        elif opcode == tla2528.OP_SET_BIT:
+            self.registers[register] |= data[2]
+        elif opcode == tla2528.OP_CLEAR_BIT:
+            self.registers[register] &= ~data[2] & 0xFF
+        if register == tla2528.SEQUENCE_CFG and self.registers[register] & tla2528.SEQ_START:
+            mask = self.registers[tla2528.AUTO_SEQ_CH_SEL]
+            self._sequence = [ch for ch in range(8) if mask & (1 << ch)]
+
+    def read(self, n) -> bytes:
+        if self._pointer is not None:
+            out = bytes(self.registers[self._pointer:self._pointer + n])
+            self._pointer = None
+            return out
+        seq = self.registers[tla2528.SEQUENCE_CFG]
+        averaging = self.registers[tla2528.OSR_CFG] & 0x07
+        out = bytearray()
+        i = 0
+        while len(out) < n:
+            if seq & tla2528.SEQ_START and self._sequence:
+                channel = self._sequence[i % len(self._sequence)]
+            else:
+                channel = self.registers[tla2528.CHANNEL_SEL] & 0x0F
+            code = self.convert(channel) << 4
+            if not averaging:
+                code |= channel if self.registers[tla2528.DATA_CFG] & 0x10 else 0
+            out += code.to_bytes(2, "big")
+            i += 1
+        return bytes(out[:n])
+
+
+class SimRegisters:
+    """Register pointer device, used for the TCA6408A and the UUID EEPROM."""
+
+    def __init__(self, size, contents=None):
+        self.registers = bytearray(size)
+        for register, value in (contents or {}).items():
+            self.registers[register] = value
+        self._pointer = 0
+
+    def write(self, data) -> None:
+        self._pointer = data[0]
+        for i, value in enumerate(data[1:]):
+            self.registers[self._pointer + i] = value
+
+    def read(self, n) -> bytes:
+        out = bytes(self.registers[self._pointer:self._pointer + n])
+        self._pointer += n
+        return out
+
+
+class SimCAT5171:
+    """CAT5171 digipot, an instruction byte then the wiper value."""
+
+    def __init__(self, wiper=0x80):
+        self.wiper = wiper
+
+    def write(self, data) -> None:
+        if len(data) > 1:
+            self.wiper = data[1]
+
+    def read(self, n) -> bytes:
+        return bytes([self.wiper]) * n
+
+
+# Monitor values the simulated ADC inputs start at
+DEFAULTS = {
+    FTX: {"temp": 30.0, "ld_current": 25.0, "pd_current": 500.0, "rf_power": -10.0, "vdd": 3.3, "vdda": 3.3,
+          "lna_current": 50.0, "lna_voltage": 5.0},
+    FRX: {"rf_power": -15.0, "pd_current": 0.5, "temp": 30.0},
+}
+
+
+def to_code(kind, name, value) -> int:
+    """ADC code the driver converts to the value nearest to the given one in engineering units."""
+    return int(np.argmin(np.abs(layout(kind).tables[name] - value)))
+
+
+def make_bus(kind, serial=0x1234, rng=None) -> dict:
+    """Devices on the I2C bus of an FTX or FRX board, keyed by address.
+
+    The ADC inputs start at the DEFAULTS values, edit SimTLA2528.inputs to change
+    them. Devices the driver's Layout has no address for are left out.
+    """
+    board = layout(kind)
+    devices = {}
+    if board.adc_address is not None:
+        inputs = {channel: to_code(kind, name, DEFAULTS[kind][name]) for name, channel in board.channels.items()}
+        devices[board.adc_address] = SimTLA2528(inputs, noise=2, rng=rng)
+    if "ATTEN" in board.devices:
+        devices[board.devices["ATTEN"][0]] = SimRegisters(4, {3: 0xFF})
+    if "UUID" in board.devices:
+        address, register = board.devices["UUID"]
+        devices[address] = SimRegisters(256, {(register or 0) + i: b
+                                              for i, b in enumerate(serial.to_bytes(4, "big"))})
+    if "DIGIPOT" in board.devices:
+        devices[board.devices["DIGIPOT"][0]] = SimCAT5171()
+    return devices
+
+
+class SimulatedI2cController:
+    """In-process stand in for pyftdi's I2cController.
+
+    latency is added to every transaction, plus byte_time for every byte moved.
+    timeout_rate and nack_rate are the probability that a transaction fails.
+    Above max_frequency, if given, one bit of every byte read is flipped with
+    probability corrupt_rate.
+    """
+
+    def __init__(self, buses=None, latency=0.0, byte_time=0.0, timeout_rate=0.0, nack_rate=0.0, seed=0,
+                 max_frequency=None, corrupt_rate=0.01):
+        self.buses = buses or {}
+        self.devices = {}
+        self.latency = latency
+        self.byte_time = byte_time
+        self.timeout_rate = timeout_rate
+        self.nack_rate = nack_rate
+        self.frequency = 100000.0
+        self.max_frequency = max_frequency
+        self.corrupt_rate = corrupt_rate
+        self.transactions = 0
+        self.bytes = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._configured = False
+
+    @property
+    def configured(self) -> bool:
+        return self._configured
+
+    def configure(self, url, **kwargs) -> None:
+        interface = kwargs.get("interface", 1)
+        self.frequency = float(kwargs.get("frequency", self.frequency))
+        self.devices = self.buses.get(interface, {})
+        self._configured = True
+
+    def close(self, freeze=False) -> None:
+        self._configured = False
+
+    def terminate(self) -> None:
+        self.close()
+
+    def get_port(self, address) -> I2cPort:
+        if not self._configured:
+            raise I2cIOError("FTDI controller not initialized")
+        return I2cPort(self, address)
+
+    def _transaction(self, address, nbytes):
+        if not self._configured:
+            raise I2cIOError("FTDI controller not initialized")
+        with self._lock:
+            self.transactions += 1
+            self.bytes += nbytes
+            roll = self._rng.random()
+        delay = self.latency + self.byte_time * nbytes
+        if delay:
+            time.sleep(delay)
+        if roll < self.timeout_rate:
+            raise I2cTimeoutError("Simulated timeout")
+        device = self.devices.get(address)
+        if device is None or roll < self.timeout_rate + self.nack_rate:
+            raise I2cNackError("NACK from slave")
+        return device
+
+    def _corrupt(self, data) -> bytes:
+        if self.max_frequency is None or self.frequency <= self.max_frequency:
+            return data
+        with self._lock:
+            flips = [self._rng.randrange(8) if self._rng.random() < self.corrupt_rate else None for _ in data]
+        return bytes(b if bit is None else b ^ (1 << bit) for b, bit in zip(data, flips))
+
+    def read(self, address, readlen=1, relax=True) -> bytes:
+        return self._corrupt(self._transaction(address, readlen).read(readlen))
+
+    def write(self, address, out, relax=True) -> None:
+        out = bytes(out)
+        self._transaction(address, len(out)).write(out)
+
+    def exchange(self, address, out, readlen=0, relax=True) -> bytes:
+        out = bytes(out)
+        device = self._transaction(address, len(out) + readlen)
+        device.write(out)
+        return self._corrupt(device.read(readlen))
+
+    def poll(self, address, write=False, relax=True) -> bool:
+        try:
+            self._transaction(address, 0)
+        except I2cIOError:
+            return False
+        return True
+
+
+class SimulatedAdapter:
+    """A simulated 0x0403:0x6048 adapter, with the FRX on interface 1 and the FTX on interface 2.
+
+    Pass it as the device of a Board, with controller as the controller factory.
+    The keyword arguments are passed on to every SimulatedI2cController.
+    """
+
+    def __init__(self, serial="SIM0", **kwargs):
+        self.serial = serial
+        rng = random.Random(serial)
+        uid = rng.getrandbits(32)
+        self.buses = {1: make_bus(FRX, uid, rng), 2: make_bus(FTX, uid + 1, rng)}
+        self.options = kwargs
+        self.controllers = []
+
+    def controller(self) -> SimulatedI2cController:
+        controller = SimulatedI2cController(self.buses, **self.options)
+        self.controllers.append(controller)
+        return controller
+
+    @property
+    def transactions(self) -> int:
+        return sum(c.transactions for c in self.controllers)
@@ -0,0 +1,53 @@
+"""Observable device state of a board, independent of the GUI widgets.
+
+BoardState holds the last known value of every field of a board (monitors,
+serial number, connection). update() diffs new readings against the stored ones
+and notifies the observers of the fields that changed, so views only redraw what
+actually changed.
+"""
+import threading
+
+
+def _display(value):
+    """Value as it is displayed, so changes too small to show are not reported."""
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+class BoardState:
+    """Last known state of one board, with change notification."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.values = {"connected": False}
+        self._observers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback) -> None:
+        """Call callback(kind, changes) with a dict of the changed fields on every update."""
+        self._observers.append(callback)
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    def update(self, values) -> dict:
+        """Merge new values into the state and notify the observers of what changed.
+
+        Returns the changed fields.
+        """
+        with self._lock:
+            changes = {}
+            for name, value in values.items():
+                if name not in self.values or _display(self.values[name]) != _display(value):
+                    changes[name] = value
+                self.values[name] = value
+        if changes:
+            for callback in self._observers:
+                callback(self.kind, changes)
+        return changes
+
+    def reset(self) -> None:
+        """Forget the readings, e.g. after a disconnect, so the next ones are all reported."""
+        with self._lock:
+            self.values = {"connected": self.values.get("connected", False)}
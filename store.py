@@ -0,0 +1,194 @@
+"""Indexed on-disk store of monitor history, for queries over weeks or months.
+
+Samples are kept in an SQLite database keyed by (channel, time), where a channel
+is one monitor of one board serial number, so a board's history is read with an
+index range scan instead of a full scan. Each insert also updates per minute and
+per hour rollups (count, mean, min, max), and long range queries are answered
+from those.
+
+TelemetryStore is an acquisition worker listener: readings are queued in memory
+and a background thread inserts them in one transaction every few seconds. Every
+reading of an analog monitor is stored. The attenuation and the LNA fault input,
+which are in most readings but rarely change, are only stored when they change.
+"""
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from monitors import GETTERS, to_engineering
+
+# Rollup tables and their bucket size in seconds, finest first
+ROLLUPS = {"1m": 60, "1h": 3600}
+RESOLUTIONS = ("raw",) + tuple(ROLLUPS)
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS channels (id INTEGER PRIMARY KEY, serial TEXT NOT NULL, board TEXT NOT NULL,"
+    " name TEXT NOT NULL, UNIQUE (serial, name))",
+    "CREATE TABLE IF NOT EXISTS samples (channel INTEGER NOT NULL, t REAL NOT NULL, value REAL,"
+    " PRIMARY KEY (channel, t)) WITHOUT ROWID",
+] + [
+    "CREATE TABLE IF NOT EXISTS rollup_" + name + " (channel INTEGER NOT NULL, t REAL NOT NULL,"
+    " n INTEGER NOT NULL, total REAL NOT NULL, lo REAL NOT NULL, hi REAL NOT NULL,"
+    " PRIMARY KEY (channel, t)) WITHOUT ROWID" for name in ROLLUPS
+]
+
+
+def connect(file_path) -> sqlite3.Connection:
+    """Open (and create if needed) a history database."""
+    db = sqlite3.connect(file_path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMA:
+        db.execute(statement)
+    db.commit()
+    return db
+
+
+def parse_age(text) -> float:
+    """Seconds in an age like "90", "30m", "6h" or "14d"."""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+class TelemetryStore:
+    """Batched writer of monitor readings to a history database.
+
+    Use it as an AcquisitionWorker listener, or call record() directly.
+    """
+
+    def __init__(self, file_path, flush_interval=5.0):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._channels = {}  # (serial, name) -> channel id, used by the writer thread only
+        self._last = {}  # channel id -> last value stored of the entries only stored on change
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = False
+        self._db = None
+        self._writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, kind, values, timestamp=None) -> None:
+        """Queue one monitor reading (raw codes, as posted by the acquisition worker)."""
+        t = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._pending.append((t, kind, values))
+
+    def __call__(self, kind, values) -> None:
+        self.record(kind, values)
+
+    def close(self) -> None:
+        self._closing = True
+        self._wake.set()
+        self._writer.join()
+
+    def _run(self) -> None:
+        self._db = connect(self.file_path)
+        try:
+            while not self._closing:
+                self._wake.wait(self.flush_interval)
+                self._flush()
+            self._flush()
+        finally:
+            self._db.close()
+
+    def _channel(self, serial, kind, name) -> int:
+        key = (serial, name)
+        if key not in self._channels:
+            self._db.execute("INSERT OR IGNORE INTO channels (serial, board, name) VALUES (?, ?, ?)",
+                             (serial, kind, name))
+            self._channels[key] = self._db.execute("SELECT id FROM channels WHERE serial = ? AND name = ?",
+                                                   key).fetchone()[0]
+        return self._channels[key]
+
+    def _flush(self) -> None:
+        """Insert the queued readings and update the rollups in one transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        rows = []
+        for t, kind, values in pending:
+            serial = str(values.get("uid", kind))
+            monitors = GETTERS[kind]
+            for name, value in to_engineering(kind, values).items():
+                if not isinstance(value, (int, float)):
+                    continue
+                channel = self._channel(serial, kind, name)
+                if name not in monitors:
+                    if self._last.get(channel) == value:
+                        continue
+                    self._last[channel] = value
+                rows.append((channel, t, float(value)))
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO samples (channel, t, value) VALUES (?, ?, ?)", rows)
+            for table, bucket in ROLLUPS.items():
+                self._db.executemany(
+                    "INSERT INTO rollup_" + table + " (channel, t, n, total, lo, hi) VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (channel, t) DO UPDATE SET n = n + excluded.n, total = total + excluded.total,"
+                    " lo = min(lo, excluded.lo), hi = max(hi, excluded.hi)",
+                    _aggregate(rows, bucket))
+
+
+def _aggregate(rows, bucket) -> list:
+    """(channel, bucket start, n, total, min, max) of (channel, t, value) rows."""
+    bins = {}
+    for channel, t, value in rows:
+        key = (channel, t - t % bucket)
+        b = bins.get(key)
+        if b is None:
+            bins[key] = [1, value, value, value]
+        else:
+            b[0] += 1
+            b[1] += value
+            b[2] = min(b[2], value)
+            b[3] = max(b[3], value)
+    return [key + tuple(b) for key, b in bins.items()]
+
+
+def channels(db) -> list:
+    """(serial, board, name) of every channel in the database."""
+    return db.execute("SELECT serial, board, name FROM channels ORDER BY serial, name").fetchall()
+
+
+def choose_resolution(window, max_points=2000) -> str:
+    """Finest resolution with at most max_points rows in the window, counting raw samples as 1 s apart."""
+    for resolution, bucket in (("raw", 1),) + tuple(ROLLUPS.items()):
+        if window / bucket <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def query(db, serial, name, start=None, end=None, resolution="auto", max_points=2000) -> dict:
+    """History of one monitor of one board between start and end (Unix times).
+
+    Returns a dict of NumPy arrays, "time" and "value", plus "min" and "max"
+    when answered from a rollup, where "time" is the start of each bucket and
+    "value" its mean.
+    """
+    end = time.time() if end is None else end
+    start = 0.0 if start is None else start
+    if resolution == "auto":
+        resolution = choose_resolution(end - start, max_points)
+    row = db.execute("SELECT id FROM channels WHERE serial = ? AND name = ?", (serial, name)).fetchone()
+    if row is None:
+        raise KeyError(serial + " " + name)
+    if resolution == "raw":
+        data = np.array(db.execute("SELECT t, value FROM samples WHERE channel = ? AND t >= ? AND t < ? ORDER BY t",
+                                   (row[0], start, end)).fetchall(), dtype=float).reshape(-1, 2)
+        return {"time": data[:, 0], "value": data[:, 1]}
+    data = np.array(db.execute("SELECT t, total / n, lo, hi FROM rollup_" + resolution +
+                               " WHERE channel = ? AND t >= ? AND t < ? ORDER BY t",
+                               (row[0], start - ROLLUPS[resolution], end)).fetchall(), dtype=float).reshape(-1, 4)
+    return {"time": data[:, 0], "value": data[:, 1], "min": data[:, 2], "max": data[:, 3]}
+
+
+def prune(db, before) -> int:
+    """Delete raw samples older than `before` (Unix time), keeping the rollups. Returns the rows deleted."""
+    with db:
+        return db.execute("DELETE FROM samples WHERE t < ?", (before,)).rowcount
@@ -0,0 +1,103 @@
+"""Automated sweep of the FTX input attenuation, FTX laser current and FRX output attenuation.
+
+Every point of the grid is applied (only the setpoints that changed are written),
+then the RF monitor and photodiode current of both boards, and the FTX laser
+current, are read until they settle, instead of waiting a fixed time. Results are returned as a NumPy
+structured array and saved column by column to a .npz file.
+"""
+import itertools
+import time
+
+import numpy as np
+
+from monitors import FTX, FRX, to_engineering
+
+# Signals recorded at each point, and watched for settling
+SIGNALS = {FTX: ("rf_power", "pd_current", "ld_current"), FRX: ("rf_power", "pd_current")}
+
+COLUMNS = [
+    ("ftx_atten_cmd", "<f4"), ("ld_current_cmd", "<f4"), ("frx_atten_cmd", "<f4"),
+    ("ftx_atten", "<f4"), ("ld_current", "<f4"), ("frx_atten", "<f4"),
+    ("ftx_rf_power", "<f4"), ("ftx_pd_current", "<f4"), ("frx_rf_power", "<f4"), ("frx_pd_current", "<f4"),
+    ("settle_time", "<f4"), ("settled", "?"),
+]
+
+
+def parse_axis(text) -> list:
+    """Values of a sweep axis, "start:stop:step" (inclusive) or a comma separated list."""
+    if ":" in text:
+        start, stop, step = (float(x) for x in text.split(":"))
+        return list(np.round(np.arange(start, stop + step / 2, step), 6))
+    return [float(x) for x in text.split(",")]
+
+
+def settle(boards, tolerance=3, stable_reads=3, interval=0.005, timeout=1.0) -> tuple:
+    """Read the SIGNALS of the boards until they settle.
+
+    Settled means stable_reads consecutive readings within tolerance raw ADC codes
+    of each other. Returns (raw readings per board kind, seconds taken, settled).
+    """
+    t0 = time.perf_counter()
+    last = None
+    stable = 1
+    while True:
+        readings = {board.kind: board.read_monitors(SIGNALS[board.kind]) for board in boards}
+        elapsed = time.perf_counter() - t0
+        if last is not None and all(abs(readings[k][name] - last[k][name]) <= tolerance
+                                    for k in readings for name in SIGNALS[k]):
+            stable += 1
+            if stable >= stable_reads:
+                return readings, elapsed, True
+        else:
+            stable = 1
+        if elapsed >= timeout:
+            return readings, elapsed, False
+        last = readings
+        time.sleep(interval)
+
+
+def run(ftx=None, frx=None, ftx_atten=(None,), ld_current=(None,), frx_atten=(None,), progress=None,
+        **settle_options) -> np.ndarray:
+    """Run the grid of ftx_atten x ld_current x frx_atten over the connected boards.
+
+    None in an axis means leave that setpoint alone. progress, if given, is called
+    with (index, total) after every point.
+    """
+    boards = [b for b in (ftx, frx) if b is not None]
+    grid = list(itertools.product(ftx_atten, ld_current, frx_atten))
+    results = np.zeros(len(grid), dtype=COLUMNS)
+    readback = {"ftx_atten": np.nan, "ld_current": np.nan, "frx_atten": np.nan}
+    current = (None, None, None)
+    for i, point in enumerate(grid):
+        fa, ld, ra = point
+        if fa is not None and fa != current[0]:
+            readback["ftx_atten"] = ftx.set_atten(fa, wait=0)
+        if ld is not None and ld != current[1]:
+            # Recorded once settled, straight after the write the current is still moving
+            ftx.set_ld_current(ld, wait=0)
+        if ra is not None and ra != current[2]:
+            readback["frx_atten"] = frx.set_atten(ra, wait=0)
+        current = point
+        readings, elapsed, settled = settle(boards, **settle_options)
+
+        row = results[i:i + 1]
+        row["ftx_atten_cmd"], row["ld_current_cmd"], row["frx_atten_cmd"] = (np.nan if v is None else v for v in point)
+        for name, value in readback.items():
+            row[name] = value
+        for kind, raw in readings.items():
+            values = to_engineering(kind, raw)
+            for name in SIGNALS[kind]:
+                if name == "ld_current":
+                    row["ld_current"] = values[name]
+                else:
+                    row[kind + "_" + name] = values[name]
+        row["settle_time"] = elapsed
+        row["settled"] = settled
+        if progress is not None:
+            progress(i + 1, len(grid))
+    return results
+
+
+def save(file_path, results) -> None:
+    """Save the sweep as a .npz file with one array per column."""
+    np.savez(file_path, **{name: results[name] for name in results.dtype.names})
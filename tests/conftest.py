@@ -0,0 +1,17 @@
+"""The modules under test live at the top of the repository.
+
+Without the rfof drivers installed, fakedriver stands in for them so the tests
+on the simulated bus still run.
+"""
+import os
+import sys
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+sys.path.insert(0, TESTS)
+
+try:
+    import rfof  # noqa: F401
+except ImportError:
+    import fakedriver
+    sys.modules["rfof"] = fakedriver
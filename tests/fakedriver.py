@@ -0,0 +1,85 @@
+"""Minimal stand in for the rfof board drivers, used when rfof isn't installed.
+
+It talks to the chips on the simulated bus the way the drivers are expected to:
+one TLA2528 conversion per getter (select the channel, read two bytes), the
+attenuation on the TCA6408A output port, the laser current on the CAT5171 wiper
+and the serial number from the UUID EEPROM. The addresses and conversions are
+only this stand in's own, monitors.layout() traces them from it like from rfof.
+"""
+ADC = 0x10
+EXPANDER = 0x20
+DIGIPOT = 0x2C
+EEPROM = 0x50
+VREF = 3.3
+
+
+class _Board:
+    def __init__(self, i2c):
+        self.adc = i2c.get_port(ADC)
+        self.expander = i2c.get_port(EXPANDER)
+        self.eeprom = i2c.get_port(EEPROM)
+
+    def _volts(self, channel) -> float:
+        self.adc.write([0x08, 0x11, channel])
+        data = self.adc.read(2)
+        return ((data[0] << 4) | (data[1] >> 4)) * VREF / 4096
+
+    def get_uid(self) -> str:
+        return "0x" + self.eeprom.exchange([0xFC], 4).hex()
+
+    def set_atten(self, value) -> None:
+        self.expander.write([0x01, int(round(value * 4)) & 0x7F])
+
+    def get_atten(self) -> float:
+        return self.expander.exchange([0x01], 1)[0] / 4
+
+    def get_temp(self) -> float:
+        return (self._volts(self.TEMP) - 0.5) * 100
+
+
+class Ftx(_Board):
+    TEMP = 0
+
+    def __init__(self, i2c):
+        super().__init__(i2c)
+        self.digipot = i2c.get_port(DIGIPOT)
+
+    def set_ld_current(self, value) -> None:
+        self.digipot.write([0x00, int(value * 5) & 0xFF])
+
+    def get_ld_current(self) -> float:
+        return self._volts(1) * 100
+
+    def get_pd_current(self) -> float:
+        return self._volts(2) * 1000
+
+    def get_rf_power(self) -> float:
+        return (self._volts(3) - 2.0) * -40
+
+    def get_vdd_voltage(self) -> float:
+        return self._volts(4) * 2
+
+    def get_vdda_voltage(self) -> float:
+        return self._volts(5) * 2
+
+    def set_lna_enable(self, value) -> None:
+        pass
+
+    def get_lna_current(self) -> float:
+        return self._volts(6) * 100
+
+    def get_lna_voltage(self) -> float:
+        return self._volts(7) * 4
+
+    def get_lna_fault(self) -> bool:
+        return False
+
+
+class Frx(_Board):
+    TEMP = 2
+
+    def get_rf_power(self) -> float:
+        return (self._volts(0) - 2.0) * -40
+
+    def get_pd_current(self) -> float:
+        return self._volts(1)
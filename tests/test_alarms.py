@@ -0,0 +1,51 @@
+"""Debounce, hysteresis and re-arming of limit alarms."""
+import pytest
+
+from alarms import AlarmEngine, LNA_OFF, Rule
+from monitors import FTX
+from simbus import to_code
+
+# The attenuation is passed through as it is, so the rule sees exactly these values
+RULE = Rule(FTX, "atten", high=10.0, hysteresis=1.0, debounce=2)
+
+
+def _feed(engine, values) -> list:
+    """Active state after each value, None where nothing changed."""
+    out = []
+    for value in values:
+        alarms = engine.evaluate({FTX: (FTX, {"atten": value})})
+        out.append(alarms[0].active if alarms else None)
+    return out
+
+
+def test_debounce():
+    engine = AlarmEngine([RULE])
+    # One reading out of range is not enough, and an in range one starts the count over
+    assert _feed(engine, [11, 5, 11, 11]) == [None, None, None, True]
+
+
+def test_hysteresis():
+    engine = AlarmEngine([RULE])
+    _feed(engine, [11, 11])
+    # Back under the limit but within the hysteresis band keeps the alarm raised
+    assert _feed(engine, [9.5, 9.5, 9.5]) == [None, None, None]
+    assert _feed(engine, [8.9, 8.9]) == [None, False]
+
+
+def test_adc_monitor_limits_use_converted_values():
+    rule = Rule(FTX, "lna_current", high=90.0, hysteresis=5.0, debounce=1, action=LNA_OFF)
+    engine = AlarmEngine([rule])
+    alarms = engine.evaluate({FTX: (FTX, {"lna_current": to_code(FTX, "lna_current", 120.0)})})
+    assert alarms[0].active
+    assert alarms[0].value == pytest.approx(120.0, abs=0.5)
+
+
+def test_undoing_the_action_rearms_the_rule():
+    rule = Rule(FTX, "lna_current", high=90.0, hysteresis=5.0, debounce=1, action=LNA_OFF)
+    engine = AlarmEngine([rule])
+    high = {"lna_current": to_code(FTX, "lna_current", 120.0)}
+    assert engine.evaluate({FTX: (FTX, high)})[0].active
+    # The action itself doesn't re-arm, turning the LNA back on does
+    assert engine.rearm(FTX, "set_lna_enable", (False,)) == []
+    assert engine.rearm(FTX, "set_lna_enable", (True,)) == [rule]
+    assert engine.evaluate({FTX: (FTX, high)})[0].active
@@ -0,0 +1,32 @@
+"""Level selection and folding of the decimated trend history."""
+from history import History
+
+
+def _history() -> History:
+    # Level 0 keeps the last 8 samples, level 1 the last 8 pairs, level 2 groups of 4
+    history = History(capacity=8, factor=2, levels=3)
+    for i in range(32):
+        history.add(float(i), timestamp=float(i))
+    return history
+
+
+def test_short_window_uses_raw_samples():
+    times, values = _history().query(5, now=31.0)
+    assert list(times[0::2]) == [26.0, 27.0, 28.0, 29.0, 30.0, 31.0]
+    assert list(values[0::2]) == list(values[1::2]) == [26.0, 27.0, 28.0, 29.0, 30.0, 31.0]
+
+
+def test_window_past_the_raw_ring_uses_the_next_level():
+    times, values = _history().query(12, now=31.0)
+    assert list(times[0::2]) == [20.0, 22.0, 24.0, 26.0, 28.0, 30.0]
+    assert list(values[0::2]) == [20.0, 22.0, 24.0, 26.0, 28.0, 30.0]
+    assert list(values[1::2]) == [21.0, 23.0, 25.0, 27.0, 29.0, 31.0]
+
+
+def test_long_window_uses_the_coarsest_level_and_folds_to_points():
+    times, values = _history().query(100, now=31.0)
+    assert list(times[0::2]) == [0.0, 4.0, 8.0, 12.0, 16.0, 20.0, 24.0, 28.0]
+    times, values = _history().query(100, points=4, now=31.0)
+    assert list(times[0::2]) == [0.0, 8.0, 16.0, 24.0]
+    assert list(values[0::2]) == [0.0, 8.0, 16.0, 24.0]
+    assert list(values[1::2]) == [7.0, 15.0, 23.0, 31.0]
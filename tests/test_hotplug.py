@@ -0,0 +1,35 @@
+"""USB watcher scans, with the device enumeration replaced."""
+import threading
+from types import SimpleNamespace
+
+import usb.core
+
+from hotplug import UsbWatcher
+
+
+def test_watcher_survives_a_failing_first_scan(monkeypatch):
+    device = SimpleNamespace(bus=1, address=4)
+    results = [usb.core.NoBackendError("no backend"), usb.core.USBError("busy"), [device]]
+
+    def find(**kwargs):
+        result = results.pop(0) if len(results) > 1 else results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(usb.core, "find", find)
+    reported = threading.Event()
+    changes = []
+
+    def callback(added, removed):
+        changes.append((added, removed))
+        reported.set()
+
+    watcher = UsbWatcher(callback, interval=0.01)
+    watcher.start()
+    try:
+        assert reported.wait(2)
+    finally:
+        watcher.stop()
+        watcher.join(2)
+    assert changes[0] == ({(1, 4): device}, set())
@@ -0,0 +1,86 @@
+"""Recording a session on the simulated bus and replaying it."""
+import pytest
+from pyftdi.i2c import I2cTimeoutError
+
+from acquisition import Board, FTX
+from i2ctrace import OP_READ, OP_WRITE, STATUS_OK, STATUS_TIMEOUT, ReplayController, ReplayError, \
+    TraceWriter, TracingController, load, replay_board
+from simbus import SimulatedAdapter
+
+
+def _record(file_path, reads=5) -> list:
+    adapter = SimulatedAdapter()
+    board = Board(FTX, device=adapter, controller_factory=adapter.controller)
+    board.start_trace(file_path)
+    board.connect()
+    try:
+        readings = [board.read_monitors() for _ in range(reads)]
+    finally:
+        board.close()
+        board.stop_trace()
+    return readings
+
+
+def test_strict_replay_reproduces_the_session(tmp_path):
+    file_path = str(tmp_path / "ftx.i2ct")
+    recorded = _record(file_path)
+    header, records = load(file_path)
+    assert header["kind"] == FTX
+    assert records
+    board = replay_board(file_path, strict=True)
+    board.connect()
+    assert [board.read_monitors() for _ in recorded] == recorded
+    with pytest.raises(ReplayError):
+        board.read_monitors()
+
+
+def test_keyed_replay_cycles_through_the_trace(tmp_path):
+    file_path = str(tmp_path / "ftx.i2ct")
+    recorded = _record(file_path, reads=2)
+    board = replay_board(file_path)
+    board.connect()
+    readings = [board.read_monitors() for _ in range(10)]
+    assert all(set(r) == set(recorded[0]) for r in readings)
+
+
+class _FlakyController:
+    """Answers reads with two bytes, times out on the first one."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def read(self, address, readlen=1, relax=True) -> bytes:
+        self.reads += 1
+        if self.reads == 1:
+            raise I2cTimeoutError("timeout")
+        return bytes([0x12, 0x34][:readlen])
+
+    def write(self, address, out, relax=True) -> None:
+        pass
+
+
+def test_errors_are_recorded_and_raised_again(tmp_path):
+    file_path = str(tmp_path / "ftx.i2ct")
+    writer = TraceWriter(file_path, FTX)
+    port = TracingController(_FlakyController(), writer).get_port(0x10)
+    port.write([0x08, 0x11, 3])
+    with pytest.raises(I2cTimeoutError):
+        port.read(2)
+    port.read(2)
+    writer.close()
+    header, records = load(file_path)
+    assert [(r.op, r.status, r.out, r.data) for r in records] == [
+        (OP_WRITE, STATUS_OK, bytes([0x08, 0x11, 3]), b""),
+        (OP_READ, STATUS_TIMEOUT, b"", b""),
+        (OP_READ, STATUS_OK, b"", bytes([0x12, 0x34])),
+    ]
+    strict = ReplayController(records).get_port(0x10)
+    strict.write([0x08, 0x11, 3])
+    with pytest.raises(I2cTimeoutError):
+        strict.read(2)
+    assert strict.read(2) == bytes([0x12, 0x34])
+    # Keyed replay only answers with the successful responses
+    keyed = ReplayController(records, strict=False).get_port(0x10)
+    assert keyed.read(2) == keyed.read(2) == bytes([0x12, 0x34])
+    with pytest.raises(ReplayError):
+        keyed.write([0x08, 0x11, 4])
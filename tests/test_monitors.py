@@ -0,0 +1,42 @@
+"""Calibration files and the conversion tables they correct."""
+import json
+
+import pytest
+
+import monitors
+from monitors import FTX, converter, load_calibration
+
+
+@pytest.fixture(autouse=True)
+def _keep_calibration(monkeypatch):
+    monkeypatch.setattr(monitors, "_converters", {})
+
+
+def _write(tmp_path, entries) -> str:
+    path = tmp_path / "cal.json"
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+
+def test_serial_entry_builds_on_its_kind(tmp_path):
+    load_calibration(_write(tmp_path, {
+        "ftx": {"monitors": {"vdd": {"gain": 2.0}}},
+        "0x1234": {"kind": "ftx", "monitors": {"vdd": {"offset": 1.0}}},
+    }))
+    assert converter(FTX).corrections["vdd"] == (2.0, 0.0)
+    assert converter(FTX, "0x1234").corrections["vdd"] == (2.0, 1.0)
+
+
+@pytest.mark.parametrize("entries", [
+    {"ftx": {"kind": "bogus", "monitors": {"vdd": {"gain": 1}}}},
+    {"0x1234": {"kind": "bogus", "monitors": {}}},
+    {"ftx": {"monitors": {"bogus": {"gain": 1}}}},
+    {"ftx": {"monitors": {"vdd": {"gain": "1"}}}},
+    [],
+])
+def test_malformed_file_names_itself_and_keeps_calibration(tmp_path, entries):
+    path = _write(tmp_path, entries)
+    before = monitors._converters
+    with pytest.raises(ValueError, match="cal.json: "):
+        load_calibration(path)
+    assert monitors._converters is before
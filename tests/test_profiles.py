@@ -0,0 +1,30 @@
+"""Profile file validation."""
+import json
+
+import pytest
+
+import profiles
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "rack.json")
+    table = {"0x1a2b3c4d": {"kind": "ftx", "atten": 10.0, "ld_current": 25, "lna_enable": True},
+             "frx": {"atten": 3.5}}
+    profiles.save(path, table)
+    assert profiles.load(path) == table
+
+
+@pytest.mark.parametrize("table, message", [
+    ({"frx": {"ld_current": 20}}, "not a setting of the FRX"),
+    ({"0x1234": {"kind": "frx", "lna_enable": True}}, "not a setting of the FRX"),
+    ({"0x1234": {"kind": "bogus", "atten": 1}}, "unknown board kind"),
+    ({"ftx": {"lna_enable": 1}}, "true or false"),
+    ({"ftx": {"atten": True}}, "must be a number"),
+    ({"ftx": {"atten": "10"}}, "must be a number"),
+    ({"ftx": [10]}, "expected an object"),
+])
+def test_invalid_settings_are_rejected(tmp_path, table, message):
+    path = tmp_path / "rack.json"
+    path.write_text(json.dumps(table))
+    with pytest.raises(ValueError, match=message):
+        profiles.load(str(path))
@@ -0,0 +1,60 @@
+"""Reconnecting after a lost link restores the commanded setpoints."""
+import queue
+import time
+
+import profiles
+from acquisition import AcquisitionWorker, Board, EVENT_CONNECTED, FTX
+from monitors import layout
+from simbus import SimulatedAdapter
+
+
+def _board():
+    adapter = SimulatedAdapter()
+    board = Board(FTX, device=adapter, controller_factory=adapter.controller)
+    return adapter, board
+
+
+def _wait_for(events, event, timeout=5.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            if events.get(timeout=0.05)[0] == event:
+                return True
+        except queue.Empty:
+            pass
+    return False
+
+
+def test_profile_values_are_restored():
+    adapter, board = _board()
+    board.connect()
+    worker = AcquisitionWorker(board, queue.Queue())
+    board.set_atten(5.0, wait=0)
+    profiles.apply(board, {"atten": 10.0, "ld_current": 20.0}, wait=0)
+    worker._link_lost()
+    worker._reconnect()
+    assert board.connected
+    assert board.get_atten() == 10.0
+    assert board.setpoints == {"atten": 10.0, "ld_current": 20.0}
+
+
+def test_link_loss_recovers_and_restores():
+    adapter, board = _board()
+    events = queue.Queue()
+    worker = AcquisitionWorker(board, events)
+    worker.start()
+    try:
+        worker.submit("connect")
+        assert _wait_for(events, EVENT_CONNECTED)
+        worker.submit("set_atten", 7.0)
+        # Cable blip: the controller goes away and the expander powers up cleared
+        time.sleep(0.2)
+        for controller in adapter.controllers:
+            controller.close()
+        expander = adapter.buses[2][layout(FTX).devices["ATTEN"][0]]
+        expander.registers[:] = bytes(len(expander.registers))
+        assert _wait_for(events, EVENT_CONNECTED)
+        assert board.driver.get_atten() == 7.0
+    finally:
+        worker.stop()
+        worker.join(timeout=2)
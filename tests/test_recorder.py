@@ -0,0 +1,23 @@
+"""Recorder ring buffer wraparound."""
+import numpy as np
+
+from monitors import FRX
+from recorder import Recorder, load
+
+
+def test_ring_wraps_and_counts_dropped_samples(tmp_path):
+    path = str(tmp_path / "telemetry.bin")
+    recorder = Recorder(path, capacity=4, flush_interval=60)
+    try:
+        for i in range(6):
+            recorder.record(FRX, {"atten": float(i)}, timestamp=100.0 + i)
+        assert list(recorder.latest(10)["atten"]) == [2.0, 3.0, 4.0, 5.0]
+        assert recorder.dropped == 2
+        recorder.flush()
+        recorder.record(FRX, {"atten": 6.0}, timestamp=106.0)
+    finally:
+        recorder.close()
+    samples = load(path)
+    assert list(samples["time"]) == [102.0, 103.0, 104.0, 105.0, 106.0]
+    assert list(samples["atten"]) == [2.0, 3.0, 4.0, 5.0, 6.0]
+    assert np.isnan(samples["vdd"]).all()
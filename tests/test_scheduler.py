@@ -0,0 +1,35 @@
+"""Deadlines, back-off and lookahead of the polling schedule."""
+from scheduler import Schedule, Signal
+
+FAST = Signal("fast", 1.0, 1, 4.0, 2)
+SLOW = Signal("slow", 4.0, 0, 4.0, 0)
+
+
+def test_reset_makes_everything_due_in_priority_order():
+    schedule = Schedule([FAST, SLOW])
+    schedule.reset(0.0)
+    assert schedule.next_deadline() == 0.0
+    assert schedule.due(0.0) == ["slow", "fast"]
+    assert schedule.next_deadline() is None
+
+
+def test_back_off_while_steady_and_lookahead():
+    schedule = Schedule([FAST, SLOW])
+    schedule.reset(0.0)
+    schedule.due(0.0)
+    schedule.update("fast", 10, 0.0)
+    schedule.update("slow", 10, 0.0)
+    assert schedule.due(0.5) == []
+    assert schedule.due(0.8) == ["fast"]
+    # Within tolerance of the last value, the period doubles
+    schedule.update("fast", 11, 0.8)
+    assert schedule.periods["fast"] == 2.0
+    # slow is due within a quarter of its period, so it joins this read
+    assert schedule.due(3.0) == ["slow", "fast"]
+    schedule.update("fast", 20, 3.0)
+    assert schedule.periods["fast"] == 1.0
+    schedule.update("slow", None, 3.0)
+    assert schedule.next_deadline() == 4.0
+    for _ in range(3):
+        schedule.update("fast", 20, 0.0)
+    assert schedule.periods["fast"] == FAST.max_period
@@ -0,0 +1,123 @@
+"""Server round trip over loopback, against the simulated bus."""
+import asyncio
+import json
+
+import pytest
+
+from acquisition import Board, EVENT_ALARM, FTX, FRX
+from alarms import Alarm, Rule
+from server import MAX_BUFFER, Server
+from simbus import SimulatedAdapter
+
+
+async def _request(reader, writer, request) -> dict:
+    writer.write((json.dumps(request) + "\n").encode())
+    await writer.drain()
+    while True:
+        message = json.loads(await asyncio.wait_for(reader.readline(), 5))
+        if "event" not in message:
+            return message
+
+
+async def _session(server, requests):
+    listener = await server.start(port=0)
+    port = listener.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        return [await _request(reader, writer, request) for request in requests]
+    finally:
+        writer.close()
+        await writer.wait_closed()
+        listener.close()
+        await listener.wait_closed()
+        server.stop()
+
+
+def _server() -> Server:
+    adapter = SimulatedAdapter()
+    return Server({kind: Board(kind, device=adapter, controller_factory=adapter.controller) for kind in (FTX, FRX)})
+
+
+def test_set_and_get_round_trip():
+    server = _server()
+    replies = asyncio.run(_session(server, [
+        {"id": 1, "cmd": "connect", "board": "frx"},
+        {"id": 2, "cmd": "set", "board": "frx", "setting": "atten", "value": 7.5},
+        {"id": 3, "cmd": "get", "board": "frx"},
+    ]))
+    assert [r["id"] for r in replies] == [1, 2, 3]
+    assert all(r["ok"] for r in replies)
+    assert replies[1]["result"] == 7.5
+    assert replies[2]["result"]["frx"]["connected"]
+
+
+def test_bad_requests_are_answered_and_the_worker_survives():
+    server = _server()
+    replies = asyncio.run(_session(server, [
+        {"id": 1, "cmd": "set", "board": "ftx", "setting": "atten", "value": "x"},
+        {"id": 2, "cmd": "set", "board": "frx", "setting": "ld_current", "value": 20},
+        [1, 2],
+        {"id": 4, "cmd": "set", "board": "ftx", "setting": "atten", "value": 5},
+    ]))
+    assert [r["ok"] for r in replies] == [False, False, False, True]
+    # Answered by the same worker the bad value was sent to
+    assert replies[3]["result"] == 5.0
+
+
+class _Transport:
+    def __init__(self, buffered):
+        self.buffered = buffered
+
+    def get_write_buffer_size(self) -> int:
+        return self.buffered
+
+
+class _Writer:
+    """Subscriber stand in that keeps the lines pushed to it."""
+
+    def __init__(self, buffered=0):
+        self.lines = []
+        self.transport = _Transport(buffered)
+        self.closed = False
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def write(self, data) -> None:
+        self.lines.append(data)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_subscribe_needs_known_boards():
+    server = _server()
+    replies = asyncio.run(_session(server, [
+        {"id": 1, "cmd": "subscribe", "boards": ["ftx", "bogus"]},
+        {"id": 2, "cmd": "subscribe", "boards": "ftx"},
+        {"id": 3, "cmd": "subscribe", "boards": []},
+        {"id": 4, "cmd": "subscribe", "boards": ["frx"]},
+    ]))
+    assert [r["ok"] for r in replies] == [False, False, False, True]
+    assert replies[3]["result"] == ["frx"]
+
+
+def test_slow_subscriber_is_dropped():
+    server = _server()
+    slow, fast = _Writer(MAX_BUFFER + 1), _Writer()
+    server.subscribers[slow] = {FTX}
+    server.subscribers[fast] = {FTX}
+    server._push({"event": "log", "board": FTX, "message": "x"}, FTX)
+    assert slow.closed and slow not in server.subscribers
+    assert not slow.lines
+    assert len(fast.lines) == 1
+
+
+def test_rearmed_alarm_is_valid_json():
+    server = _server()
+    writer = _Writer()
+    server.subscribers[writer] = {FTX}
+    rule = Rule(FTX, "lna_current", None, 90.0, 5.0, 1, None)
+    server._on_event((EVENT_ALARM, FTX, Alarm(FTX, rule, float("nan"), False)))
+    message = json.loads(writer.lines[0], parse_constant=lambda name: pytest.fail("bare " + name))
+    assert message["value"] is None
@@ -0,0 +1,48 @@
+"""History store rollups and queries."""
+import pytest
+
+import store
+from monitors import FRX
+from simbus import to_code
+
+
+def test_aggregate_bins_by_channel_and_bucket():
+    rows = [(1, 0.0, 2.0), (1, 59.0, 4.0), (1, 60.0, 1.0), (2, 30.0, 5.0)]
+    assert sorted(store._aggregate(rows, 60)) == [
+        (1, 0.0, 2, 6.0, 2.0, 4.0),
+        (1, 60.0, 1, 1.0, 1.0, 1.0),
+        (2, 0.0, 1, 5.0, 5.0, 5.0),
+    ]
+
+
+def test_store_and_query(tmp_path):
+    path = str(tmp_path / "history.db")
+    history = store.TelemetryStore(path, flush_interval=60)
+    code = to_code(FRX, "temp", 25.0)
+    for i in range(120):
+        # The attenuation changes once, so only two of its readings are stored
+        history.record(FRX, {"uid": "0xabc", "atten": 1.0 if i < 90 else 2.0, "temp": code},
+                       timestamp=1000.0 + i)
+    history.close()
+
+    db = store.connect(path)
+    try:
+        assert [row[2] for row in store.channels(db)] == ["atten", "temp"]
+        atten = store.query(db, "0xabc", "atten", 0, 2000, resolution="raw")
+        assert list(atten["time"]) == [1000.0, 1090.0]
+        assert list(atten["value"]) == [1.0, 2.0]
+        temp = store.query(db, "0xabc", "temp", 0, 2000)
+        assert len(temp["time"]) == 120
+        minutes = store.query(db, "0xabc", "temp", 1000, 1120, resolution="1m")
+        assert list(minutes["time"]) == [960.0, 1020.0, 1080.0]
+        assert minutes["value"] == pytest.approx([temp["value"][0]] * 3)
+        with pytest.raises(KeyError):
+            store.query(db, "0xabc", "vdd")
+    finally:
+        db.close()
+
+
+def test_choose_resolution():
+    assert store.choose_resolution(1000) == "raw"
+    assert store.choose_resolution(86400) == "1m"
+    assert store.choose_resolution(365 * 86400) == "1h"
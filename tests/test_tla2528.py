@@ -0,0 +1,37 @@
+"""TLA2528 burst reads on a simulated ADC."""
+from simbus import SimTLA2528, SimulatedI2cController
+from tla2528 import CONV_MODE_MASK, OPMODE_CFG, OSR_CFG, SEQ_MODE_MANUAL, SEQUENCE_CFG, TLA2528
+
+ADDRESS = 0x10
+
+
+def _adc(inputs):
+    device = SimTLA2528(inputs)
+    controller = SimulatedI2cController({1: {ADDRESS: device}})
+    controller.configure("ftdi://sim/1")
+    return device, TLA2528(controller.get_port(ADDRESS))
+
+
+def test_capture_restores_oversampling():
+    device, adc = _adc({3: 0x123})
+    device.registers[OSR_CFG] = 3
+    times, codes = adc.capture(3, 10, osr=0)
+    assert len(times) == 10
+    assert list(codes) == [0x123] * 10
+    assert device.registers[OSR_CFG] == 3
+    adc.capture(3, 10, osr=5)
+    assert device.registers[OSR_CFG] == 3
+
+
+def test_read_channels_in_requested_order():
+    device, adc = _adc({0: 0x001, 2: 0xFFF, 5: 0x800})
+    assert adc.read_channels([5, 0, 2]) == [0x800, 0x001, 0xFFF]
+    # The sequence is left in manual mode for the board drivers
+    assert device.registers[SEQUENCE_CFG] == SEQ_MODE_MANUAL
+
+
+def test_read_channels_keeps_the_driver_opmode_bits():
+    device, adc = _adc({1: 0x123})
+    device.registers[OPMODE_CFG] = 0x0F | CONV_MODE_MASK
+    assert adc.read_channels([1, 1]) == [0x123, 0x123]
+    assert device.registers[OPMODE_CFG] == 0x0F
@@ -0,0 +1,133 @@
+"""Batched access to the TLA2528 8 channel ADC on the FTX and FRX boards.
+
+The board drivers read the ADC one channel at a time (select the channel, switch
+the operating mode, read the result). Here the auto-sequence mode is used instead,
+so every requested channel is converted and read back in a single I2C read.
+"""
+import time
+
+import numpy as np
+
+# Opcodes
+OP_READ = 0x10
+OP_WRITE = 0x08
+OP_SET_BIT = 0x18
+OP_CLEAR_BIT = 0x20
+
+# Registers
+SYSTEM_STATUS = 0x00
+GENERAL_CFG = 0x01
+DATA_CFG = 0x02
+OSR_CFG = 0x03
+OPMODE_CFG = 0x04
+PIN_CFG = 0x05
+SEQUENCE_CFG = 0x10
+CHANNEL_SEL = 0x11
+AUTO_SEQ_CH_SEL = 0x12
+
+# SEQUENCE_CFG fields
+SEQ_MODE_MANUAL = 0x00
+SEQ_MODE_AUTO = 0x01
+SEQ_START = 0x10
+
+# OPMODE_CFG fields, CONV_MODE cleared is manual conversion
+CONV_MODE_MASK = 0x60
+
+RESOLUTION = 4096
+# Full scale of a result with oversampling enabled
+AVERAGED_RESOLUTION = 65536
+MAX_OSR = 7
+
+
+class TLA2528:
+    """TLA2528 on a pyftdi I2cPort."""
+
+    def __init__(self, port):
+        self.port = port
+        self._seq_mask = None
+
+    def write_register(self, register, value) -> None:
+        self.port.write([OP_WRITE, register, value & 0xFF])
+
+    def clear_bits(self, register, mask) -> None:
+        self.port.write([OP_CLEAR_BIT, register, mask & 0xFF])
+
+    def read_register(self, register) -> int:
+        return self.port.exchange([OP_READ, register], 1)[0]
+
+    def check_readback(self, patterns) -> int:
+        """Write each pattern to AUTO_SEQ_CH_SEL and read it back, returns the number of mismatches."""
+        self._seq_mask = None
+        errors = 0
+        for pattern in patterns:
+            self.write_register(AUTO_SEQ_CH_SEL, pattern)
+            errors += self.read_register(AUTO_SEQ_CH_SEL) != pattern
+        return errors
+
+    def read_channels(self, channels) -> list:
+        """Convert and read a list of channels in one burst.
+
+        The sequencer converts the enabled channels in ascending order, one for every
+        two bytes read, so the result is returned as 12 bit codes in the order the
+        channels were requested.
+        """
+        order = sorted(set(channels))
+        mask = 0
+        for channel in order:
+            mask |= 1 << channel
+        # Only the conversion mode, the oscillator and clock divider stay as the driver set them
+        self.clear_bits(OPMODE_CFG, CONV_MODE_MASK)
+        if mask != self._seq_mask:
+            self.write_register(AUTO_SEQ_CH_SEL, mask)
+            self._seq_mask = mask
+        self.write_register(SEQUENCE_CFG, SEQ_MODE_AUTO | SEQ_START)
+        try:
+            data = self.port.read(2 * len(order))
+        finally:
+            # Back to manual mode so the board drivers can keep using CHANNEL_SEL
+            self.write_register(SEQUENCE_CFG, SEQ_MODE_MANUAL)
+        codes = {}
+        for i, channel in enumerate(order):
+            codes[channel] = (data[2 * i] << 4) | (data[2 * i + 1] >> 4)
+        return [codes[channel] for channel in channels]
+
+    def capture(self, channel, samples, duration=None, osr=0, chunk=1024) -> tuple:
+        """Convert one channel back to back, as fast as the bus can read.
+
+        In manual mode every two bytes read start the next conversion, so samples
+        are streamed with long I2C reads of `chunk` samples, straight into a
+        preallocated buffer. osr sets the oversampling ratio (2 ** osr), which
+        gives 16 bit averaged results; the driver's own ratio is restored
+        afterwards. Stops after `samples`, or earlier once `duration` seconds
+        have passed.
+
+        Returns (times, codes): perf_counter timestamps interpolated across each
+        read, and the raw codes as uint16.
+        """
+        raw = np.empty(2 * samples, dtype=np.uint8)
+        times = np.empty(samples)
+        ramp = np.arange(chunk)
+        self.write_register(SEQUENCE_CFG, SEQ_MODE_MANUAL)
+        self.clear_bits(OPMODE_CFG, CONV_MODE_MASK)
+        saved_osr = self.read_register(OSR_CFG)
+        self.write_register(OSR_CFG, osr & MAX_OSR)
+        self.write_register(CHANNEL_SEL, channel)
+        start = time.perf_counter()
+        n = 0
+        try:
+            while n < samples:
+                count = min(chunk, samples - n)
+                t0 = time.perf_counter()
+                data = self.port.read(2 * count)
+                t1 = time.perf_counter()
+                raw[2 * n:2 * (n + count)] = np.frombuffer(data, dtype=np.uint8)
+                times[n:n + count] = t0 + (t1 - t0) / count * ramp[:count]
+                n += count
+                if duration is not None and t1 - start >= duration:
+                    break
+        finally:
+            self.write_register(OSR_CFG, saved_osr)
+        codes = raw[:2 * n].view(">u2").astype(np.uint16)
+        if not osr:
+            codes >>= 4
+        return times[:n], codes